@@ -0,0 +1,218 @@
+"""Stress test for the coin system: concurrent earns and redemptions, then a
+check that the balance moved by exactly the sum of the recorded transactions.
+
+This is a manual tool, run by hand against a dev build; nothing runs it
+automatically. The in-process mode calls add_coins/spend_coins directly, and
+the HTTP mode drives the API from threads in this one client process.
+
+In-process (default) it loads the app module and calls add_coins/spend_coins
+from many threads, optionally in several processes sharing the SQLite backend:
+
+    STORAGE_BACKEND=sqlite python coin_stress_bench.py --processes 4 --threads 8
+
+Against a running server it goes through the HTTP API instead:
+
+    python coin_stress_bench.py --url http://127.0.0.1:8000 --user user_123
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+EARN_SOURCE = "song"          # 3 coins (plus any level-up bonus)
+REDEEM_REWARD = "reward_002"  # costs 6 coins
+REDEEM_COST = 6
+
+
+def load_app(path):
+    spec = importlib.util.spec_from_file_location("coin_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def default_app_path():
+    for candidate in ("main.py", os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_1758209791845.py")):
+        if os.path.exists(candidate):
+            return candidate
+    return "main.py"
+
+
+# ---------- in-process ----------
+
+def _worker_ops(app, user_id, ops, seed):
+    rng = random.Random(seed)
+    earned = redeemed = declined = 0
+    for _ in range(ops):
+        if rng.random() < 0.6:
+            app.add_coins(user_id, 3, EARN_SOURCE, None, "bench earn")
+            earned += 1
+        elif app.spend_coins(user_id, REDEEM_COST, "reward", REDEEM_REWARD, "bench redeem", reward_id=REDEEM_REWARD):
+            redeemed += 1
+        else:
+            declined += 1
+    return earned, redeemed, declined
+
+
+def _process_main(app_path, user_id, threads, ops, seed, results):
+    app = load_app(app_path)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        counts = list(pool.map(lambda i: _worker_ops(app, user_id, ops, seed * 1000 + i), range(threads)))
+    results.put(tuple(sum(c[i] for c in counts) for i in range(3)))
+
+
+def _history_since(fetch_page, start_id):
+    """Transactions newer than start_id, walking pages newest first."""
+    collected, before = [], None
+    while True:
+        page = fetch_page(before)
+        for txn in page:
+            if txn["id"] == start_id:
+                return collected
+            collected.append(txn)
+        if not page:
+            return collected
+        before = page[-1]["id"]
+
+
+def run_in_process(args):
+    app = load_app(args.app)
+    user_id = args.user
+    if app.storage.get_user(user_id) is None:
+        app.storage.save_user({**app.default_user, "id": user_id, "username": user_id,
+                               "email": f"{user_id}@bench.local", "coins": 0})
+    if args.processes > 1 and app.STORAGE_BACKEND != "sqlite":
+        print("Memory backend is per process; running a single process")
+        args.processes = 1
+
+    start_balance = app.storage.get_user(user_id)["coins"]
+    newest = app.storage.user_transactions(user_id, 1)
+    start_id = newest[0]["id"] if newest else None
+
+    started = time.perf_counter()
+    if args.processes == 1:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            counts = list(pool.map(lambda i: _worker_ops(app, user_id, args.ops, i), range(args.threads)))
+    else:
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_process_main,
+                                         args=(args.app, user_id, args.threads, args.ops, p + 1, results))
+                 for p in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        counts = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    elapsed = time.perf_counter() - started
+
+    end_balance = app.storage.get_user(user_id)["coins"]
+    history = _history_since(lambda before: app.storage.user_transactions(user_id, 500, before), start_id)
+    return report(counts, elapsed, start_balance, end_balance, history)
+
+
+# ---------- HTTP ----------
+
+def _request(url, data=None):
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body), timeout=30) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def _http_worker_ops(base, user_id, ops, seed):
+    rng = random.Random(seed)
+    earned = redeemed = declined = 0
+    for _ in range(ops):
+        if rng.random() < 0.6:
+            status, _ = _request(f"{base}/api/user/{user_id}/earn-coins", {"source": EARN_SOURCE})
+            earned += status == 200
+        else:
+            status, _ = _request(f"{base}/api/user/{user_id}/redeem-reward/{REDEEM_REWARD}", {})
+            if status == 200:
+                redeemed += 1
+            else:
+                declined += 1
+    return earned, redeemed, declined
+
+
+def run_http(args):
+    base = args.url.rstrip("/")
+    user_id = args.user
+
+    def fetch_page(before):
+        query = {"limit": 200, **({"before": before} if before else {})}
+        return _request(f"{base}/api/user/{user_id}/transactions?{urllib.parse.urlencode(query)}")[1]
+
+    status, user = _request(f"{base}/api/user/{user_id}")
+    if status != 200:
+        sys.exit(f"User {user_id} not found at {base}")
+    start_balance = user["coins"]
+    newest = fetch_page(None)
+    start_id = newest[0]["id"] if newest else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        counts = list(pool.map(lambda i: _http_worker_ops(base, user_id, args.ops, i), range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    end_balance = _request(f"{base}/api/user/{user_id}")[1]["coins"]
+    return report(counts, elapsed, start_balance, end_balance, _history_since(fetch_page, start_id))
+
+
+def report(counts, elapsed, start_balance, end_balance, history):
+    earned = sum(c[0] for c in counts)
+    redeemed = sum(c[1] for c in counts)
+    declined = sum(c[2] for c in counts)
+    ops = earned + redeemed + declined
+    ids = [txn["id"] for txn in history]
+    ledger_delta = sum(txn["amount"] for txn in history)
+    spends = sum(1 for txn in history if txn["transaction_type"] == "spend")
+
+    print(f"{ops} ops in {elapsed:.2f}s ({ops / elapsed:.0f} ops/s): "
+          f"{earned} earns, {redeemed} redemptions, {declined} declined")
+    print(f"balance {start_balance} -> {end_balance} (delta {end_balance - start_balance}), "
+          f"ledger delta {ledger_delta} over {len(history)} transactions")
+
+    failures = []
+    if end_balance - start_balance != ledger_delta:
+        failures.append("balance change does not match the ledger")
+    if len(set(ids)) != len(ids):
+        failures.append("duplicate transaction ids")
+    if len(history) != earned + redeemed:
+        failures.append(f"expected {earned + redeemed} transactions, found {len(history)}")
+    if spends != redeemed:
+        failures.append(f"{redeemed} successful redemptions but {spends} spend transactions")
+    if end_balance < 0:
+        failures.append("negative balance")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: balance matches ledger, ids unique")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server (HTTP mode)")
+    parser.add_argument("--app", default=default_app_path(), help="app module path for in-process mode")
+    parser.add_argument("--user", default="bench_user")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    args = parser.parse_args()
+    ok = run_http(args) if args.url else run_in_process(args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,33 @@
-from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, Union
+import asyncio
+import base64
+import bisect
+import gzip
+import hashlib
+import heapq
 import json
 import os
 import re
 import shutil
 import subprocess
 import signal
+import sqlite3
+import struct
+import threading
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from email.utils import formatdate
+from mimetypes import guess_type
 import random
 from typing import Optional
 
@@ -20,14 +37,6 @@ running_games: Dict[str, int] = {}
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
-"""Serve built React static assets under /assets if present (ReactRecreation build)."""
-try:
-    SPA_DIR_OVERRIDE = os.path.join(os.getcwd(), "ReactRecreation", "ReactRecreation", "dist", "public")
-    SPA_ASSETS = os.path.join(SPA_DIR_OVERRIDE, "assets")
-    if os.path.isdir(SPA_ASSETS):
-        app.mount("/assets", StaticFiles(directory=SPA_ASSETS), name="spa_assets")
-except Exception:
-    pass
 
 # Templates no longer used (legacy removed), but keep for safety if needed
 templates = Jinja2Templates(directory="templates")
@@ -36,6 +45,8 @@ templates = Jinja2Templates(directory="templates")
 SPA_DIR = os.path.join(os.getcwd(), "ReactRecreation", "ReactRecreation", "dist", "public")
 SPA_INDEX = os.path.join(SPA_DIR, "index.html")
 SPA_VITE_SVG = os.path.join(SPA_DIR, "vite.svg")
+# Built assets are served by serve_spa_asset (below) rather than a StaticFiles mount
+SPA_ASSETS = os.path.join(SPA_DIR, "assets")
 
 # --------------------
 # Search API
@@ -43,62 +54,519 @@ SPA_VITE_SVG = os.path.join(SPA_DIR, "vite.svg")
 def normalize_text(text: str) -> str:
     return (text or "").strip().lower()
 
-def index_items_for_search():
-    items = []
-    # Movies
-    for m in movies_db:
-        items.append({
-            "type": "movie",
-            "id": m.get("id"),
-            "title": m.get("title"),
-            "description": m.get("description"),
-            "year": m.get("year"),
-            "category": m.get("category")
-        })
-    # Videos and songs are represented in frontend_videos
-    for v in frontend_videos:
-        vdict = v.dict() if hasattr(v, "dict") else dict(v)
-        item_type = "song" if (vdict.get("category") or "").lower() == "audio" else "video"
-        items.append({
-            "type": item_type,
-            "id": vdict.get("id"),
-            "title": vdict.get("title"),
-            "description": vdict.get("description") or "",
-            "category": vdict.get("category")
-        })
-    return items
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _movie_search_item(m: dict) -> dict:
+    return {
+        "type": "movie",
+        "id": m.get("id"),
+        "title": m.get("title"),
+        "description": m.get("description"),
+        "year": m.get("year"),
+        "category": m.get("category")
+    }
+
+def _video_search_item(v) -> dict:
+    vdict = v.dict() if hasattr(v, "dict") else dict(v)
+    item_type = "song" if (vdict.get("category") or "").lower() == "audio" else "video"
+    return {
+        "type": item_type,
+        "id": vdict.get("id"),
+        "title": vdict.get("title"),
+        "description": vdict.get("description") or "",
+        "category": vdict.get("category")
+    }
 
-def score_match(item: dict, q: str) -> int:
+def score_match(title: str, desc: str, q: str) -> int:
+    """Score already-normalized title/description text (as the search index stores it)."""
     score = 0
-    title = normalize_text(item.get("title", ""))
-    desc = normalize_text(item.get("description", ""))
     if q in title:
         score += 10
     if q in desc:
         score += 5
     return score
 
+def _trigrams(term: str) -> Set[str]:
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _fuzzy_max_distance(token: str) -> int:
+    # Short tokens get no slack: one edit in a 3-letter word is a different word
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 6:
+        return 1
+    return 2
+
+def bounded_edit_distance(a: str, b: str, max_dist: int) -> int:
+    """Levenshtein distance, giving up with max_dist + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1]
+
+# Fields /api/search can return facet counts for
+SEARCH_FACETS = ("type", "category", "year")
+
+def _facet_values(item: dict) -> List[Tuple[str, str]]:
+    pairs = []
+    for field in SEARCH_FACETS:
+        value = item.get(field)
+        if value is not None and value != "":
+            pairs.append((field, normalize_text(str(value))))
+    return pairs
+
+class SearchIndex:
+    """In-memory token-level inverted index over movies and frontend videos.
+
+    Documents are keyed by (source, id) where source is "movie" or "frontend",
+    and get a dense integer doc id that is kept across updates so result
+    ordering stays stable. Postings map each token to the doc ids containing
+    it; a sorted vocabulary lets the last (partially typed) query token expand
+    as a prefix. Candidates are re-checked with the score_match weighting, so
+    a query costs time proportional to the postings it touches.
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, dict] = {}
+        self.text: Dict[int, Tuple[str, str]] = {}
+        self.doc_tokens: Dict[int, Tuple[Set[str], Set[str]]] = {}
+        self.keys: Dict[Tuple[str, Any], int] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self.vocab: List[str] = []
+        self.grams: Dict[str, Set[str]] = {}
+        self.facet_ids: Dict[str, Dict[str, Set[int]]] = {field: {} for field in SEARCH_FACETS}
+        self._next_doc_id = 0
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, key: Tuple[str, Any], item: dict):
+        """Insert or replace the document stored under key."""
+        doc_id = self.keys.get(key)
+        if doc_id is None:
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            self.keys[key] = doc_id
+        else:
+            self._unpost(doc_id)
+        title = normalize_text(item.get("title") or "")
+        desc = normalize_text(item.get("description") or "")
+        title_tokens = set(_TOKEN_RE.findall(title))
+        desc_tokens = set(_TOKEN_RE.findall(desc))
+        self.docs[doc_id] = item
+        self.text[doc_id] = (title, desc)
+        for field, value in _facet_values(item):
+            self.facet_ids[field].setdefault(value, set()).add(doc_id)
+        self.doc_tokens[doc_id] = (title_tokens, desc_tokens)
+        for tok in title_tokens | desc_tokens:
+            ids = self.postings.get(tok)
+            if ids is None:
+                ids = self.postings[tok] = set()
+                bisect.insort(self.vocab, tok)
+                for g in _trigrams(tok):
+                    self.grams.setdefault(g, set()).add(tok)
+            ids.add(doc_id)
+
+    def remove(self, key: Tuple[str, Any]):
+        doc_id = self.keys.pop(key, None)
+        if doc_id is None:
+            return
+        self._unpost(doc_id)
+        self.docs.pop(doc_id, None)
+        self.text.pop(doc_id, None)
+        self.doc_tokens.pop(doc_id, None)
+
+    def _unpost(self, doc_id: int):
+        old_item = self.docs.get(doc_id)
+        if old_item is not None:
+            for field, value in _facet_values(old_item):
+                values = self.facet_ids[field]
+                ids = values.get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del values[value]
+        title_tokens, desc_tokens = self.doc_tokens.get(doc_id, (set(), set()))
+        for tok in title_tokens | desc_tokens:
+            ids = self.postings.get(tok)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[tok]
+                pos = bisect.bisect_left(self.vocab, tok)
+                if pos < len(self.vocab) and self.vocab[pos] == tok:
+                    del self.vocab[pos]
+                for g in _trigrams(tok):
+                    terms = self.grams.get(g)
+                    if terms is not None:
+                        terms.discard(tok)
+                        if not terms:
+                            del self.grams[g]
+
+    def _prefix_postings(self, prefix: str) -> Set[int]:
+        ids: Set[int] = set()
+        pos = bisect.bisect_left(self.vocab, prefix)
+        while pos < len(self.vocab) and self.vocab[pos].startswith(prefix):
+            ids |= self.postings[self.vocab[pos]]
+            pos += 1
+        return ids
+
+    def candidates(self, q: str) -> Set[int]:
+        """Doc ids containing every query token (the last one as a prefix)."""
+        tokens = _TOKEN_RE.findall(q)
+        if not tokens:
+            return set()
+        *complete, last = tokens
+        # Start from the rarest exact token so intersections stay small
+        lists = sorted((self.postings.get(tok, set()) for tok in complete), key=len)
+        lists.append(self._prefix_postings(last))
+        result = set(lists[0])
+        for ids in lists[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def fuzzy_terms(self, token: str) -> Dict[str, int]:
+        """Vocabulary terms within a bounded edit distance of token.
+
+        Terms sharing too few trigrams with the token cannot be within the
+        distance bound (one edit touches at most three padded trigrams), so
+        only the survivors of that count filter get the edit-distance check.
+        """
+        max_dist = _fuzzy_max_distance(token)
+        if max_dist == 0:
+            return {token: 0} if token in self.postings else {}
+        grams = _trigrams(token)
+        counts: Dict[str, int] = {}
+        for g in grams:
+            for term in self.grams.get(g, ()):
+                counts[term] = counts.get(term, 0) + 1
+        needed = len(grams) - 3 * max_dist
+        matches = {}
+        for term, shared in counts.items():
+            if shared < needed or abs(len(term) - len(token)) > max_dist:
+                continue
+            d = bounded_edit_distance(token, term, max_dist)
+            if d <= max_dist:
+                matches[term] = d
+        return matches
+
+    def fuzzy_scores(self, q: str) -> Dict[int, int]:
+        """Score docs where every query token has a close term in the doc."""
+        tokens = _TOKEN_RE.findall(q)
+        expansions = [self.fuzzy_terms(tok) for tok in tokens]
+        if not tokens or not all(expansions):
+            return {}
+        result: Optional[Set[int]] = None
+        for terms in sorted(expansions, key=len):
+            ids: Set[int] = set()
+            for term in terms:
+                ids |= self.postings[term]
+            result = ids if result is None else result & ids
+            if not result:
+                return {}
+        scores = {}
+        for doc_id in result:
+            title_tokens, desc_tokens = self.doc_tokens[doc_id]
+            score = 0
+            for weight, field in ((10, title_tokens), (5, desc_tokens)):
+                dists = [min((d for t, d in terms.items() if t in field), default=None) for terms in expansions]
+                if None not in dists:
+                    score += weight - sum(dists)
+            if score > 0:
+                scores[doc_id] = score
+        return scores
+
+    def match(self, q: str, fuzzy: bool = False) -> Dict[int, int]:
+        """Score every doc matching q, before any category filter."""
+        scores: Dict[int, int] = {}
+        for doc_id in self.candidates(q):
+            title, desc = self.text[doc_id]
+            s = score_match(title, desc, q)
+            if s > 0:
+                scores[doc_id] = s
+        if fuzzy:
+            for doc_id, s in self.fuzzy_scores(q).items():
+                if s > scores.get(doc_id, 0):
+                    scores[doc_id] = s
+        return scores
+
+    def rank(self, scores: Dict[int, int], category: Optional[str] = None, limit: int = 20) -> List[dict]:
+        cat = normalize_text(category) if category else None
+        scored = []
+        for doc_id, s in scores.items():
+            it = self.docs[doc_id]
+            if cat and cat not in [normalize_text(it.get("type")), normalize_text(it.get("category", ""))]:
+                continue
+            scored.append((-s, doc_id))
+        results = []
+        for neg_score, doc_id in heapq.nsmallest(limit, scored):
+            it_copy = dict(self.docs[doc_id])
+            it_copy["score"] = -neg_score
+            results.append(it_copy)
+        return results
+
+    def search(self, q: str, category: Optional[str] = None, limit: int = 20, fuzzy: bool = False) -> List[dict]:
+        return self.rank(self.match(q, fuzzy), category, limit)
+
+    def facet_counts(self, doc_ids) -> Dict[str, Dict[str, int]]:
+        """Count matches per facet value by intersecting the matched ids with
+        each value's id set (set intersection walks the smaller side)."""
+        counts: Dict[str, Dict[str, int]] = {field: {} for field in SEARCH_FACETS}
+        if not doc_ids:
+            return counts
+        matched = doc_ids if isinstance(doc_ids, (set, frozenset)) else set(doc_ids)
+        for field, values in self.facet_ids.items():
+            for value, ids in values.items():
+                n = len(matched & ids)
+                if n:
+                    counts[field][value] = n
+        return counts
+
+search_index = SearchIndex()
+
+# Typeahead: titles kept per trie node, and how many leading characters are indexed
+SUGGEST_NODE_K = 10
+SUGGEST_MAX_DEPTH = 32
+
+class _TrieNode:
+    __slots__ = ("children", "terminals", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terminals: Set[str] = set()
+        self.top: List[str] = []
+
+class TitleSuggester:
+    """Prefix trie over catalog titles for typeahead.
+
+    Every word-start suffix of a normalized title is inserted ("healing
+    meditation" is reachable from "he..." and "me..."), capped at
+    SUGGEST_MAX_DEPTH characters. Each node keeps the SUGGEST_NODE_K best
+    titles of its subtree ranked by popularity (movie rating), so a lookup is
+    a walk down the prefix plus a read of that node's list. Titles shared by
+    several catalog entries (a movie and its frontend video) are stored once.
+    """
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.key_titles: Dict[Tuple[str, Any], str] = {}
+
+    def clear(self):
+        self.__init__()
+
+    def _rank(self, title_norm: str):
+        return (-self.entries[title_norm]["score"], title_norm)
+
+    def _suffixes(self, title_norm: str) -> List[str]:
+        return [title_norm[m.start():][:SUGGEST_MAX_DEPTH] for m in _TOKEN_RE.finditer(title_norm)]
+
+    def add(self, key: Tuple[str, Any], title: Optional[str], popularity: float = 0.0):
+        self.remove(key)
+        title_norm = normalize_text(title)
+        if not title_norm:
+            return
+        entry = self.entries.get(title_norm)
+        is_new = entry is None
+        if is_new:
+            entry = self.entries[title_norm] = {"title": title, "keys": {}, "score": 0.0}
+        entry["keys"][key] = float(popularity or 0.0)
+        entry["score"] = max(entry["keys"].values())
+        self.key_titles[key] = title_norm
+        self._update_paths(title_norm, add=is_new)
+
+    def remove(self, key: Tuple[str, Any]):
+        title_norm = self.key_titles.pop(key, None)
+        if title_norm is None:
+            return
+        entry = self.entries[title_norm]
+        entry["keys"].pop(key, None)
+        if entry["keys"]:
+            entry["score"] = max(entry["keys"].values())
+            self._update_paths(title_norm)
+        else:
+            self._update_paths(title_norm, drop=True)
+            del self.entries[title_norm]
+
+    def _update_paths(self, title_norm: str, add: bool = False, drop: bool = False):
+        for suffix in set(self._suffixes(title_norm)):
+            path = [self.root]
+            node = self.root
+            for ch in suffix:
+                child = node.children.get(ch)
+                if child is None:
+                    child = node.children[ch] = _TrieNode()
+                node = child
+                path.append(node)
+            if add:
+                node.terminals.add(title_norm)
+            if drop:
+                node.terminals.discard(title_norm)
+            # Recompute the top-k lists bottom-up along the touched path only
+            for depth in range(len(path) - 1, -1, -1):
+                n = path[depth]
+                pool = set(n.terminals)
+                for c in n.children.values():
+                    pool.update(c.top)
+                if drop:
+                    pool.discard(title_norm)
+                n.top = heapq.nsmallest(SUGGEST_NODE_K, pool, key=self._rank)
+                if depth and not n.top and not n.children:
+                    del path[depth - 1].children[suffix[depth - 1]]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        node = self.root
+        prefix = prefix[:SUGGEST_MAX_DEPTH]
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        results = []
+        for title_norm in node.top[:limit]:
+            entry = self.entries[title_norm]
+            source, item_id = min(entry["keys"], key=lambda k: (-entry["keys"][k], k[0] != "movie"))
+            results.append({"title": entry["title"], "source": source, "id": item_id})
+        return results
+
+title_suggester = TitleSuggester()
+
+class QueryCache:
+    """Size-bounded LRU of search responses, tagged with the catalog version.
+
+    An entry written under an older catalog_version is treated as a miss and
+    dropped, so catalog writes never need to walk the cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[tuple, Tuple[int, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        version, value = entry
+        if version != catalog_version:
+            del self.entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value: Any):
+        self.entries[key] = (catalog_version, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "catalog_version": catalog_version,
+        }
+
+# Bumped on every change to movies_db or frontend_videos
+catalog_version = 0
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+search_cache = QueryCache(SEARCH_CACHE_SIZE)
+
+def _catalog_changed():
+    global catalog_version
+    catalog_version += 1
+
+def _index_movie(m: dict):
+    _catalog_changed()
+    key = ("movie", m.get("id"))
+    search_index.add(key, _movie_search_item(m))
+    title_suggester.add(key, m.get("title"), m.get("rating") or 0.0)
+
+def _unindex_movie(movie_id: int):
+    _catalog_changed()
+    key = ("movie", movie_id)
+    search_index.remove(key)
+    title_suggester.remove(key)
+
+def _index_frontend_video(v):
+    _catalog_changed()
+    key = ("frontend", v.id)
+    search_index.add(key, _video_search_item(v))
+    title_suggester.add(key, v.title)
+
+def _unindex_frontend_video(video_id: str):
+    _catalog_changed()
+    key = ("frontend", video_id)
+    search_index.remove(key)
+    title_suggester.remove(key)
+
+def rebuild_search_index():
+    search_index.clear()
+    title_suggester.clear()
+    for m in storage.list_movies():
+        _index_movie(m)
+    for v in frontend_videos:
+        _index_frontend_video(v)
+
 @app.get("/api/search")
-async def search(query: Optional[str] = None, category: Optional[str] = None, limit: int = 20):
+async def search(query: Optional[str] = None, category: Optional[str] = None, limit: int = 20, fuzzy: bool = False, facets: bool = False):
     """Unified search across movies, videos, and songs.
     - query: text to search
     - category: optional filter (movie|video|song|yoga|meditation etc.)
+    - fuzzy: also match words within a small edit distance ("medatation")
+    - facets: add per-type/category/year counts over everything the query matched
     """
     q = normalize_text(query or "")
     if not q:
-        return {"results": []}
-    items = index_items_for_search()
-    results = []
-    for it in items:
-        if category and normalize_text(category) not in [normalize_text(it.get("type")), normalize_text(it.get("category", ""))]:
-            continue
-        s = score_match(it, q)
-        if s > 0:
-            it_copy = dict(it)
-            it_copy["score"] = s
-            results.append(it_copy)
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return {"results": results[:max(1, min(limit, 50))]}
+        return {"results": [], "facets": search_index.facet_counts(())} if facets else {"results": []}
+    limit = max(1, min(limit, 50))
+    cache_key = (q, normalize_text(category), limit, fuzzy, facets)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    scores = search_index.match(q, fuzzy)
+    response = {"results": search_index.rank(scores, category, limit)}
+    if facets:
+        response["facets"] = search_index.facet_counts(scores)
+    search_cache.put(cache_key, response)
+    return response
+
+@app.get("/api/search/cache-stats")
+async def search_cache_stats():
+    """Hit/miss/eviction counters for the search result cache."""
+    return search_cache.stats()
+
+@app.get("/api/search/suggest")
+async def search_suggest(prefix: Optional[str] = None, limit: int = 8):
+    """Typeahead title completions for a prefix, best rated first."""
+    p = normalize_text(prefix or "")
+    if not p:
+        return {"suggestions": []}
+    return {"suggestions": title_suggester.suggest(p, max(1, min(limit, SUGGEST_NODE_K)))}
 
 # Pydantic models
 class Movie(BaseModel):
@@ -125,6 +593,10 @@ class RecreationVideo(BaseModel):
     created_at: str
     user_id: Optional[str] = None
 
+class MoviePage(BaseModel):
+    items: List[Movie]
+    next_cursor: Optional[str] = None
+
 class MovieCreate(BaseModel):
     title: str
     description: str
@@ -178,8 +650,183 @@ class UserReward(BaseModel):
     redeemed_at: str
     is_used: bool = False
 
+def _sorted_insert(values: List, value):
+    pos = bisect.bisect_left(values, value)
+    if pos == len(values) or values[pos] != value:
+        values.insert(pos, value)
+
+def _sorted_remove(values: List, value):
+    pos = bisect.bisect_left(values, value)
+    if pos < len(values) and values[pos] == value:
+        del values[pos]
+
+def _keyset_page(keys: List, after, limit: int) -> Tuple[List, Optional[Any]]:
+    """Up to limit keys from an ascending list that come after `after`, plus the next cursor key."""
+    start = bisect.bisect_right(keys, after) if after is not None else 0
+    page = keys[start:start + limit]
+    next_after = page[-1] if page and start + limit < len(keys) else None
+    return page, next_after
+
+# Listing endpoints return everything unless the client asks for a page
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+
+def _encode_cursor(kind: str, after: Any) -> str:
+    raw = json.dumps({"k": kind, "a": after}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _valid_cursor_position(kind: str, after: Any) -> bool:
+    # Recreation pages are keyed by [created_at, id]; every other listing by an integer
+    if kind == "recreation":
+        return isinstance(after, list) and len(after) == 2 and all(isinstance(v, str) for v in after)
+    return isinstance(after, int) and not isinstance(after, bool)
+
+def _decode_cursor(kind: str, cursor: Optional[str]) -> Any:
+    """Position encoded in an opaque cursor from _encode_cursor, or None for the first page."""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data.get("k") != kind or not _valid_cursor_position(kind, data["a"]):
+            raise ValueError(kind)
+        return data["a"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page_limit(limit: Optional[int]) -> int:
+    # Range is enforced by the endpoints' Query(ge=1, le=PAGE_MAX_LIMIT)
+    return PAGE_DEFAULT_LIMIT if limit is None else limit
+
+def _page_response(kind: str, items: List[Any], next_after: Any) -> Dict[str, Any]:
+    return {
+        "items": items,
+        "next_cursor": _encode_cursor(kind, next_after) if next_after is not None else None,
+    }
+
+# Changes on every process start so ETags never outlive the in-memory state they describe
+_BOOT_ID = f"{os.getpid():x}{int(datetime.now().timestamp()):x}"
+
+def _conditional(request: Request, resource: str, version: int) -> Tuple[str, Optional[Response]]:
+    """Strong ETag for this resource version and request URL, plus a 304
+    response to return as-is if the client already holds it."""
+    variant = zlib.crc32(f"{request.url.path}?{sorted(request.query_params.multi_items())}".encode("utf-8"))
+    etag = f'"{resource}-{_BOOT_ID}-{version}-{variant:08x}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return etag, Response(status_code=304, headers={"ETag": etag})
+    return etag, None
+
+class MovieStore:
+    """Movie records keyed by id, with a category -> ids secondary index.
+
+    Ids come from a monotonic allocator, so a deleted movie's id is never
+    handed out again, and id order is insertion order. Both the id list and
+    each category's ids are kept sorted for keyset pagination. Deletes only
+    pop the dict entry; the stale ids they leave in the sorted lists are
+    skipped on read and swept out once they outnumber the live records.
+    """
+
+    # Sweep stale ids no more often than this, so small stores don't churn
+    COMPACT_MIN_STALE = 64
+
+    def __init__(self, movies: Optional[List[dict]] = None):
+        self.by_id: Dict[int, dict] = {}
+        self.ids: List[int] = []
+        self.by_category: Dict[Any, List[int]] = {}
+        self.category_counts: Dict[Any, int] = {}
+        self._stale = 0
+        self._next_id = 1
+        self.version = 0
+        for m in movies or []:
+            self.insert(m)
+
+    def __iter__(self):
+        return iter(self.list())
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def allocate_id(self) -> int:
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    def get(self, movie_id: int) -> Optional[dict]:
+        return self.by_id.get(movie_id)
+
+    def insert(self, movie: dict):
+        """Store movie under movie["id"], replacing any record with that id in place."""
+        movie_id = movie["id"]
+        category = movie.get("category")
+        old = self.by_id.get(movie_id)
+        if old is None:
+            _sorted_insert(self.ids, movie_id)
+        elif old.get("category") != category:
+            self._leave_category(old.get("category"))
+        if old is None or old.get("category") != category:
+            _sorted_insert(self.by_category.setdefault(category, []), movie_id)
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        self.by_id[movie_id] = movie
+        if movie_id >= self._next_id:
+            self._next_id = movie_id + 1
+        self.version += 1
+
+    def delete(self, movie_id: int) -> Optional[dict]:
+        movie = self.by_id.pop(movie_id, None)
+        if movie is not None:
+            self._stale += 1
+            self._leave_category(movie.get("category"))
+            self.version += 1
+            if self._stale > max(self.COMPACT_MIN_STALE, len(self.by_id)):
+                self._compact()
+        return movie
+
+    def _leave_category(self, category):
+        """Drop one live member from category; its id stays in the list as stale."""
+        count = self.category_counts.get(category, 0) - 1
+        if count > 0:
+            self.category_counts[category] = count
+            self._stale += 1
+        else:
+            self.category_counts.pop(category, None)
+            self.by_category.pop(category, None)
+
+    def _compact(self):
+        self.ids = [i for i in self.ids if i in self.by_id]
+        for category, ids in self.by_category.items():
+            self.by_category[category] = [i for i in ids if self._live(i, category) is not None]
+        self._stale = 0
+
+    def _live(self, movie_id: int, category: Optional[str] = None) -> Optional[dict]:
+        movie = self.by_id.get(movie_id)
+        if movie is None or (category and movie.get("category") != category):
+            return None
+        return movie
+
+    def list(self, category: Optional[str] = None) -> List[dict]:
+        ids = self.by_category.get(category, []) if category else self.ids
+        return [m for m in (self._live(i, category) for i in ids) if m is not None]
+
+    def page(self, after: Optional[int], limit: int, category: Optional[str] = None) -> Tuple[List[dict], Optional[int]]:
+        ids = self.by_category.get(category, []) if category else self.ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        page: List[dict] = []
+        for pos in range(start, len(ids)):
+            movie = self._live(ids[pos], category)
+            if movie is None:
+                continue
+            if len(page) == limit:
+                return page, page[-1]["id"]
+            page.append(movie)
+        return page, None
+
+    def categories(self) -> List[str]:
+        return [c for c in self.category_counts if c is not None]
+
 # In-memory database (replace with real database in production)
-movies_db = []
+movies_db = MovieStore()
 recreation_videos_db = []
 
 # Simple video catalog for ReactRecreation frontend
@@ -193,13 +840,386 @@ class FrontendVideo(BaseModel):
     video_url: Optional[str] = None
     created_at: str
 
-frontend_videos: List[FrontendVideo] = []
+def _encode_json(data: Any) -> bytes:
+    # Same encoding as JSONResponse, so cached bodies match what FastAPI would send
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+_EMPTY_JSON_LIST = _encode_json([])
+
+class VideoCatalog:
+    """FrontendVideo entries bucketed by lowercased category.
+
+    Each entry gets a monotonic sequence number on first insert (kept if it
+    is replaced), and the full list and every bucket hold sorted sequence
+    numbers, which gives a stable order for keyset pagination. Each entry's
+    dict form is computed once on insert, and the encoded JSON body for the
+    full list and for each bucket is cached until the next mutation, so the
+    /api/videos reads serve bytes directly.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, FrontendVideo] = {}
+        self.dicts: Dict[str, dict] = {}
+        self.seq_by_id: Dict[str, int] = {}
+        self.id_by_seq: Dict[int, str] = {}
+        self.seqs: List[int] = []
+        self.buckets: Dict[str, List[int]] = {}
+        self._next_seq = 0
+        self._payloads: Dict[Optional[str], bytes] = {}
+        self.version = 0
+
+    def __iter__(self):
+        return iter([self.by_id[self.id_by_seq[n]] for n in self.seqs])
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.by_id
+
+    def get(self, video_id: str) -> Optional[FrontendVideo]:
+        return self.by_id.get(video_id)
+
+    def append(self, video: FrontendVideo):
+        """Add video, or replace the entry with the same id keeping its position."""
+        seq = self.seq_by_id.get(video.id)
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+            self.seq_by_id[video.id] = seq
+            self.id_by_seq[seq] = video.id
+            self.seqs.append(seq)
+        else:
+            self._unlink_bucket(self.by_id[video.id], seq)
+        self.by_id[video.id] = video
+        self.dicts[video.id] = video.dict()
+        _sorted_insert(self.buckets.setdefault((video.category or "").lower(), []), seq)
+        self._payloads.clear()
+        self.version += 1
+
+    def extend(self, videos: List[FrontendVideo]):
+        for v in videos:
+            self.append(v)
+
+    def remove(self, video_id: str) -> Optional[FrontendVideo]:
+        video = self.by_id.pop(video_id, None)
+        if video is None:
+            return None
+        seq = self.seq_by_id.pop(video_id)
+        del self.id_by_seq[seq]
+        _sorted_remove(self.seqs, seq)
+        self.dicts.pop(video_id, None)
+        self._unlink_bucket(video, seq)
+        self._payloads.clear()
+        self.version += 1
+        return video
+
+    def _unlink_bucket(self, video: FrontendVideo, seq: int):
+        cat = (video.category or "").lower()
+        bucket = self.buckets.get(cat)
+        if bucket is not None:
+            _sorted_remove(bucket, seq)
+            if not bucket:
+                del self.buckets[cat]
+
+    def _seqs_for(self, category: Optional[str]) -> List[int]:
+        if category is None:
+            return self.seqs
+        return self.buckets.get(category.lower(), [])
+
+    def payload(self, category: Optional[str] = None) -> bytes:
+        """Encoded JSON list of all videos, or of one category (case-insensitive)."""
+        key = category.lower() if category is not None else None
+        if key is not None and key not in self.buckets:
+            # Unknown categories share one constant body rather than a cache entry each
+            return _EMPTY_JSON_LIST
+        body = self._payloads.get(key)
+        if body is None:
+            body = _encode_json([self.dicts[self.id_by_seq[n]] for n in self._seqs_for(key)])
+            self._payloads[key] = body
+        return body
+
+    def page(self, after: Optional[int], limit: int, category: Optional[str] = None) -> Tuple[List[dict], Optional[int]]:
+        page, next_after = _keyset_page(self._seqs_for(category), after, limit)
+        return [self.dicts[self.id_by_seq[n]] for n in page], next_after
+
+frontend_videos = VideoCatalog()
+
+class UserStore:
+    """User records keyed by id, with case-insensitive email and username indexes.
+
+    Records are the plain dicts returned to clients; they are stored and
+    handed out as-is, so callers update balances on the dict directly. Call
+    reindex() after changing a user's email or username.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, dict] = {}
+        self.by_email: Dict[str, str] = {}
+        self.by_username: Dict[str, str] = {}
+        # user id -> (email key, username key) it was indexed under
+        self._keys: Dict[str, Tuple[str, str]] = {}
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.by_id
+
+    def get(self, user_id: str) -> Optional[dict]:
+        return self.by_id.get(user_id)
+
+    def get_by_email(self, email: str) -> Optional[dict]:
+        user_id = self.by_email.get(normalize_text(email))
+        return self.by_id.get(user_id) if user_id is not None else None
+
+    def get_by_username(self, username: str) -> Optional[dict]:
+        user_id = self.by_username.get(normalize_text(username))
+        return self.by_id.get(user_id) if user_id is not None else None
+
+    def add(self, user: dict):
+        """Store user under user["id"], replacing any record with that id."""
+        self.remove(user["id"])
+        self.by_id[user["id"]] = user
+        self._link(user)
+
+    def remove(self, user_id: str) -> Optional[dict]:
+        user = self.by_id.pop(user_id, None)
+        if user is not None:
+            self._unlink(user)
+        return user
+
+    def reindex(self, user_id: str):
+        user = self.by_id.get(user_id)
+        if user is not None:
+            self._unlink(user)
+            self._link(user)
+
+    def _link(self, user: dict):
+        keys = (normalize_text(user.get("email")), normalize_text(user.get("username")))
+        if keys[0]:
+            self.by_email[keys[0]] = user["id"]
+        if keys[1]:
+            self.by_username[keys[1]] = user["id"]
+        self._keys[user["id"]] = keys
+
+    def _unlink(self, user: dict):
+        email, username = self._keys.pop(user["id"], ("", ""))
+        if email and self.by_email.get(email) == user["id"]:
+            del self.by_email[email]
+        if username and self.by_username.get(username) == user["id"]:
+            del self.by_username[username]
+
+def _record_number(record_id: str) -> int:
+    """Sequence number in an id like txn_42 or user_reward_7."""
+    return int(record_id.rsplit("_", 1)[1])
+
+class UserHistory:
+    """Per-user append-only history (coin transactions, redeemed rewards).
+
+    Each user has <directory>/<sha1[:2]>/<sha1>.jsonl with one record per line
+    in id order, plus a .idx file of fixed-size (number, offset) entries, so
+    the newest records or the position of a cursor are found without reading
+    the whole file. The coin ledger's writer thread appends records once the
+    log segment holding them is durable; until then they are served from
+    `tail`. Reads only look at files and copy the tail, so they are safe in
+    a worker thread.
+    """
+
+    INDEX_ENTRY = struct.Struct(">QQ")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # user id -> [(ledger seq, record)] not yet confirmed on disk
+        self.tail: Dict[str, List[Tuple[int, dict]]] = {}
+        # Records ever appended; the next id number is total + 1
+        self.total = 0
+        # Writer-thread state: last number on disk per user, files to fsync
+        self.last_number: Dict[str, int] = {}
+        self.dirty: Set[str] = set()
+
+    def _paths(self, user_id: str) -> Tuple[str, str]:
+        key = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.jsonl", f"{base}.idx"
+
+    def append(self, user_id: str, record: dict, seq: int):
+        self.total += 1
+        self.tail.setdefault(user_id, []).append((seq, record))
+
+    def written(self, upto: int):
+        """Drop tail records with ledger seq <= upto; they are on disk now."""
+        for user_id, pending in list(self.tail.items()):
+            remaining = [(seq, record) for seq, record in pending if seq > upto]
+            if remaining:
+                self.tail[user_id] = remaining
+            else:
+                del self.tail[user_id]
+
+    def _recover(self, data_path: str, index_path: str) -> int:
+        """Cut a torn append off both files; returns the last number on disk."""
+        size = self.INDEX_ENTRY.size
+        try:
+            with open(index_path, "r+b") as index, open(data_path, "r+b") as data:
+                count = os.fstat(index.fileno()).st_size // size
+                while count:
+                    index.seek((count - 1) * size)
+                    number, offset = self.INDEX_ENTRY.unpack(index.read(size))
+                    data.seek(offset)
+                    line = data.readline()
+                    if line.endswith(b"\n"):
+                        index.truncate(count * size)
+                        data.truncate(offset + len(line))
+                        return number
+                    count -= 1
+                index.truncate(0)
+                data.truncate(0)
+        except FileNotFoundError:
+            for path in (data_path, index_path):
+                if os.path.exists(path):
+                    os.truncate(path, 0)
+        return 0
+
+    def write(self, entries: List[Tuple[str, dict]]):
+        """Append (user id, record) pairs; records already on disk are skipped,
+        so replaying a log segment after a crash is harmless."""
+        by_user: Dict[str, List[dict]] = {}
+        for user_id, record in entries:
+            by_user.setdefault(user_id, []).append(record)
+        for user_id, records in by_user.items():
+            data_path, index_path = self._paths(user_id)
+            last = self.last_number.pop(user_id, None)
+            if last is None:
+                last = self._recover(data_path, index_path)
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            lines: List[bytes] = []
+            index_entries: List[bytes] = []
+            with open(data_path, "ab") as data:
+                offset = data.tell()
+                for record in records:
+                    number = _record_number(record["id"])
+                    if number <= last:
+                        continue
+                    line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+                    lines.append(line)
+                    index_entries.append(self.INDEX_ENTRY.pack(number, offset))
+                    offset += len(line)
+                    last = number
+                data.write(b"".join(lines))
+            # Index after data: every index entry points at a complete line
+            with open(index_path, "ab") as index:
+                index.write(b"".join(index_entries))
+            self.last_number[user_id] = last
+            self.dirty.update((data_path, index_path))
+
+    def sync(self):
+        """fsync every file written since the last call."""
+        dirty, self.dirty = self.dirty, set()
+        for path in dirty:
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+
+    def _tail(self, user_id: str) -> List[dict]:
+        # Copy before touching the files: anything dropped from the tail
+        # after this point is already on disk
+        return [record for _, record in list(self.tail.get(user_id, ()))]
+
+    def newest(self, user_id: str, limit: int, before: Optional[str] = None) -> List[dict]:
+        """Up to limit of the user's records, newest first, older than id
+        `before` when given. Raises KeyError for an id that is not one of
+        this user's records."""
+        tail = self._tail(user_id)
+        before_number = None
+        if before is not None:
+            try:
+                before_number = _record_number(before)
+            except (IndexError, ValueError):
+                raise KeyError(before)
+        found = before is None or any(record["id"] == before for record in tail)
+        on_disk: List[dict] = []
+        data_path, index_path = self._paths(user_id)
+        size = self.INDEX_ENTRY.size
+        try:
+            with open(index_path, "rb") as index, open(data_path, "rb") as data:
+                count = os.fstat(index.fileno()).st_size // size
+
+                def number_at(i: int) -> int:
+                    index.seek(i * size)
+                    return self.INDEX_ENTRY.unpack(index.read(size))[0]
+
+                end = count
+                if before_number is not None:
+                    lo, hi = 0, count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if number_at(mid) < before_number:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    end = lo
+                    found = found or (lo < count and number_at(lo) == before_number)
+                start = max(0, end - limit)
+                if start < end:
+                    index.seek(start * size)
+                    data.seek(self.INDEX_ENTRY.unpack(index.read(size))[1])
+                    on_disk = [json.loads(data.readline()) for _ in range(end - start)]
+        except FileNotFoundError:
+            pass
+        if not found:
+            raise KeyError(before)
+        merged = {_record_number(record["id"]): record for record in on_disk}
+        for record in tail:
+            number = _record_number(record["id"])
+            if before_number is None or number < before_number:
+                merged[number] = record
+        return [merged[n] for n in sorted(merged, reverse=True)[:limit]]
+
+    def all(self, user_id: str) -> List[dict]:
+        """Every record of the user, oldest first."""
+        tail = self._tail(user_id)
+        records: Dict[int, dict] = {}
+        data_path, index_path = self._paths(user_id)
+        try:
+            with open(index_path, "rb") as index, open(data_path, "rb") as data:
+                count = os.fstat(index.fileno()).st_size // self.INDEX_ENTRY.size
+                for _ in range(count):
+                    record = json.loads(data.readline())
+                    records[_record_number(record["id"])] = record
+        except FileNotFoundError:
+            pass
+        for record in tail:
+            records[_record_number(record["id"])] = record
+        return [records[n] for n in sorted(records)]
+
+class TransactionLog(UserHistory):
+    """Coin transaction history plus per (user, source) counts, kept in memory."""
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.source_counts: Dict[Tuple[str, str], int] = {}
+
+    def add(self, transaction: dict, seq: int):
+        self.append(transaction["user_id"], transaction, seq)
+        key = (transaction["user_id"], transaction["source"])
+        self.source_counts[key] = self.source_counts.get(key, 0) + 1
+
+    def count(self, user_id: str, source: str) -> int:
+        return self.source_counts.get((user_id, source), 0)
+
+    def restore(self, source_counts: List[Tuple[str, str, int]], total: int):
+        """Reset the counters to a snapshot."""
+        self.source_counts = {(user_id, source): n for user_id, source, n in source_counts}
+        self.total = total
 
 # Coin System Database
-users_db = []
-coin_transactions_db = []
+users_db = UserStore()
+HISTORY_DIR = os.path.join("data", "ledger", "history")
+coin_transactions_db = TransactionLog(os.path.join(HISTORY_DIR, "transactions"))
 rewards_db = []
-user_rewards_db = []
+user_rewards_db = UserHistory(os.path.join(HISTORY_DIR, "user_rewards"))
 
 # Initialize default user
 default_user = {
@@ -214,7 +1234,7 @@ default_user = {
     "achievements": [],
     "created_at": datetime.now().isoformat()
 }
-users_db.append(default_user)
+users_db.add(default_user)
 
 # Initialize rewards catalog
 default_rewards = [
@@ -275,6 +1295,9 @@ default_rewards = [
     }
 ]
 rewards_db.extend(default_rewards)
+# Part of the /api/rewards ETag. The catalog is seed data with no write path
+# (redeeming only adds user_rewards), so it stays at 0 for the process lifetime.
+rewards_version = 0
 
 # Create directories for recreation videos
 os.makedirs("static/recreation/videos", exist_ok=True)
@@ -369,244 +1392,2220 @@ sample_movies = [
 ]
 
 # Initialize database with sample data
-movies_db = sample_movies.copy()
+movies_db = MovieStore(sample_movies)
 
-# Seed simple frontend videos list from sample movies so React UI has data
-if not frontend_videos:
-    for m in movies_db:
-        frontend_videos.append(FrontendVideo(
-            id=str(m["id"]),
-            title=m["title"],
-            description=m["description"],
-            category=(m.get("category") or "General").title(),
-            duration=m.get("duration") or "",
-            poster_url=m.get("poster_url"),
-            video_url=None,
-            created_at=datetime.now().isoformat()
-        ))
-    
-    # Add some audio content for the React app
-    frontend_videos.extend([
-        FrontendVideo(
-            id="audio_1",
-            title="Healing Meditation",
-            description="Relaxing sounds for meditation and stress relief.",
-            category="Audio",
-            duration="5:00",
-            poster_url="/static/images/song_thumbnails/healing_meditation_thumb.jpg",
-            video_url="/static/songs/432hz-healing-meditation-396482.mp3",
-            created_at=datetime.now().isoformat()
-        ),
-        FrontendVideo(
-            id="audio_2",
-            title="Nature Sounds",
-            description="Soothing nature sounds for sleep and relaxation.",
-            category="Audio",
-            duration="10:00",
-            poster_url="/static/images/song_thumbnails/nature_meditation_thumb.jpg",
-            video_url="/static/songs/nature-sounds-slow-meditation-healing-frequency-432hz-368787.mp3",
-            created_at=datetime.now().isoformat()
-        ),
-        FrontendVideo(
-            id="audio_3",
-            title="Alpha Music",
-            description="432Hz frequency music for deep focus and meditation.",
-            category="Audio",
-            duration="8:00",
-            poster_url="/static/images/song_thumbnails/alpha_music_thumb.jpg",
-            video_url="/static/songs/alpha-music-432hz-the-first-314853.mp3",
-            created_at=datetime.now().isoformat()
-        )
-    ])
+# ==================== STORAGE ====================
+# Endpoints reach movies, users, coin transactions, rewards and recreation
+# records through `storage`. MemoryRepository keeps today's in-process
+# structures (with the coin ledger for durability); SqliteRepository keeps
+# everything in one SQLite file in WAL mode so several worker processes can
+# share state. STORAGE_BACKEND picks one ("memory" or "sqlite").
+#
+# Handlers go through run_storage, which moves calls into a worker thread when
+# the backend blocks (SQLite can wait up to busy_timeout for the write lock);
+# the memory backend runs inline on the event loop, which owns its structures.
+#
+# Only the data above lives in SQLite. These stay per worker process, so with
+# several SQLite workers they can disagree until each worker restarts:
+# - the search index and suggester (fed from this worker's own writes),
+# - the search QueryCache,
+# - ETags, which include the per-process _BOOT_ID, so the same unchanged
+#   resource gets a different ETag from each worker and a client bounced
+#   between workers gets fewer 304s.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "memory").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join("data", "app.db"))
 
-# Auto-index local media from static/videos and static/songs
-def _safe_title_from_filename(filename: str) -> str:
-    base = os.path.splitext(os.path.basename(filename))[0]
-    # Replace separators with spaces and normalize
-    return re.sub(r"[_-]+", " ", base).strip().title()
+class Repository(ABC):
+    """Storage interface. Records are plain dicts shaped as the API returns them."""
 
-def index_static_media():
-    try:
-        existing_ids = {v.id for v in frontend_videos}
+    # True when calls do blocking I/O and must stay off the event loop
+    blocking = False
 
-        # Videos
-        videos_dir = os.path.join("static", "videos")
-        if os.path.isdir(videos_dir):
-            for name in os.listdir(videos_dir):
-                if not any(name.lower().endswith(ext) for ext in [".mp4", ".webm", ".mov", ".mkv"]):
-                    continue
-                vid_id = f"vid_{name}"
-                if vid_id in existing_ids:
-                    continue
-                poster = None
-                # Try to find a matching thumbnail in static/images/thumbnails
-                thumb_dir = os.path.join("static", "images", "thumbnails")
-                base = os.path.splitext(name)[0]
-                possible_thumbs = [
-                    f"{base}_thumb.jpg",
-                    f"{base}.jpg",
-                    f"{base}.png",
-                ]
-                for t in possible_thumbs:
-                    candidate = os.path.join(thumb_dir, t)
-                    if os.path.isfile(candidate):
-                        poster = f"/static/images/thumbnails/{t}"
-                        break
-                frontend_videos.append(FrontendVideo(
-                    id=vid_id,
-                    title=_safe_title_from_filename(name),
-                    description=None,
-                    category="Videos",
-                    duration="",
-                    poster_url=poster,
-                    video_url=f"/static/videos/{name}",
-                    created_at=datetime.now().isoformat()
-                ))
-                existing_ids.add(vid_id)
-
-        # Songs (as Audio category)
-        songs_dir = os.path.join("static", "songs")
-        default_song_thumb = "/static/images/song_thumbnails/meditation_thumb.jpg"
-        if os.path.isdir(songs_dir):
-            for name in os.listdir(songs_dir):
-                if not any(name.lower().endswith(ext) for ext in [".mp3", ".wav", ".aac", ".ogg", ".m4a"]):
-                    continue
-                song_id = f"audio_{name}"
-                if song_id in existing_ids:
-                    continue
-                # Try to map thumbnails by simple heuristics
-                poster = default_song_thumb
-                lower = name.lower()
-                thumb_map = [
-                    ("alpha", "/static/images/song_thumbnails/alpha_music_thumb.jpg"),
-                    ("nature", "/static/images/song_thumbnails/nature_meditation_thumb.jpg"),
-                    ("comfort", "/static/images/song_thumbnails/comfort_sounds_thumb.jpg"),
-                    ("healing", "/static/images/song_thumbnails/healing_meditation_thumb.jpg"),
-                ]
-                for key, url in thumb_map:
-                    if key in lower:
-                        poster = url
-                        break
-                frontend_videos.append(FrontendVideo(
-                    id=song_id,
-                    title=_safe_title_from_filename(name),
-                    description=None,
-                    category="Audio",
-                    duration="",
-                    poster_url=poster,
-                    video_url=f"/static/songs/{name}",
-                    created_at=datetime.now().isoformat()
-                ))
-                existing_ids.add(song_id)
-    except Exception:
-        # Non-fatal: keep app running even if indexing fails
+    async def start(self):
         pass
 
-# Perform indexing at startup
-index_static_media()
+    async def stop(self):
+        pass
 
-# Routes
-@app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request):
-    # Serve ReactRecreation SPA
-    if os.path.exists(SPA_INDEX):
-        return FileResponse(SPA_INDEX)
-    return HTMLResponse("<h3>React build not found. Please build the app in ReactRecreation/ReactRecreation.</h3>")
+    async def sync(self):
+        """Wait until writes made so far are durable."""
 
-@app.get("/api/movies", response_model=List[Movie])
-async def get_movies(category: Optional[str] = None):
-    if category:
-        return [movie for movie in movies_db if movie["category"] == category]
-    return movies_db
+    # Users and coin transactions
+    @abstractmethod
+    def get_user(self, user_id: str) -> Optional[dict]:
+        ...
 
-@app.get("/api/movies/{movie_id}", response_model=Movie)
-async def get_movie(movie_id: int):
-    for movie in movies_db:
-        if movie["id"] == movie_id:
-            return movie
-    return {"error": "Movie not found"}
+    @abstractmethod
+    def save_user(self, user: dict):
+        ...
 
-@app.post("/api/movies", response_model=Movie)
-async def create_movie(movie: MovieCreate):
-    new_id = max([m["id"] for m in movies_db], default=0) + 1
-    new_movie = {
-        "id": new_id,
-        **movie.dict()
-    }
-    movies_db.append(new_movie)
-    return new_movie
+    @abstractmethod
+    def get_user_for_update(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        """A private copy of the user plus its version, for commit_coin_change."""
+
+    @abstractmethod
+    def commit_coin_change(self, user: dict, version: int, transactions: List[dict],
+                           reward_ids: List[str]) -> Optional[dict]:
+        """Atomically store the user's new state, its transactions (assigning
+        their ids) and reward redemptions, if the stored user is still at
+        `version`. Returns {"user", "transactions", "user_rewards"}, or None
+        when another writer got there first."""
+
+    @abstractmethod
+    def user_transactions(self, user_id: str, limit: int, before: Optional[str] = None) -> List[dict]:
+        """Newest first, older than transaction id `before`; KeyError if that id is not the user's."""
+
+    @abstractmethod
+    def count_transactions(self, user_id: str, source: str) -> int:
+        ...
+
+    # Rewards
+    @abstractmethod
+    def rewards_version(self) -> int:
+        ...
+
+    @abstractmethod
+    def list_rewards(self, category: Optional[str] = None) -> List[dict]:
+        """Available rewards, optionally in one category."""
+
+    @abstractmethod
+    def get_reward(self, reward_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def list_user_rewards(self, user_id: str) -> List[dict]:
+        ...
+
+    # Movies
+    @abstractmethod
+    def movies_version(self) -> int:
+        ...
+
+    @abstractmethod
+    def list_movies(self, category: Optional[str] = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def page_movies(self, after: Optional[int], limit: int, category: Optional[str] = None) -> Tuple[List[dict], Optional[int]]:
+        ...
+
+    @abstractmethod
+    def get_movie(self, movie_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def create_movie(self, fields: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def replace_movie(self, movie_id: int, fields: dict) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def delete_movie(self, movie_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def movie_categories(self) -> List[str]:
+        ...
+
+    # Recreation video records
+    @abstractmethod
+    def list_recreation_records(self, category: Optional[str] = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def add_recreation_record(self, fields: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def update_recreation_record(self, record_id: int, fields: dict):
+        ...
+
+    @abstractmethod
+    def delete_recreation_record(self, record_id: int) -> Optional[dict]:
+        ...
+
+class MemoryRepository(Repository):
+    """The module-level stores above; coin changes are made durable by coin_ledger.
+    History reads (user_transactions, list_user_rewards) go to the per-user
+    files and may be called from a worker thread."""
+
+    def __init__(self):
+        self.user_versions: Dict[str, int] = {}
+
+    async def start(self):
+        await coin_ledger.start()
+
+    async def stop(self):
+        await coin_ledger.stop()
+
+    async def sync(self):
+        await coin_ledger.sync()
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        return users_db.get(user_id)
+
+    def save_user(self, user: dict):
+        users_db.add(user)
+
+    def get_user_for_update(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        user = users_db.get(user_id)
+        if user is None:
+            return None
+        return dict(user), self.user_versions.get(user_id, 0)
+
+    def commit_coin_change(self, user: dict, version: int, transactions: List[dict],
+                           reward_ids: List[str]) -> Optional[dict]:
+        if self.user_versions.get(user["id"], 0) != version:
+            return None
+        self.user_versions[user["id"]] = version + 1
+        # Update in place so references to the stored dict stay current
+        live = users_db.get(user["id"])
+        live.update(user)
+        for transaction in transactions:
+            # total survives ledger compaction, so ids are never reused
+            transaction["id"] = f"txn_{coin_transactions_db.total + 1}"
+            coin_transactions_db.add(transaction, coin_ledger.append("txn", txn=transaction, user=live))
+        user_rewards = [self._add_user_reward(live["id"], reward_id) for reward_id in reward_ids]
+        return {"user": live, "transactions": transactions, "user_rewards": user_rewards}
+
+    def user_transactions(self, user_id: str, limit: int, before: Optional[str] = None) -> List[dict]:
+        return coin_transactions_db.newest(user_id, limit, before)
+
+    def count_transactions(self, user_id: str, source: str) -> int:
+        return coin_transactions_db.count(user_id, source)
+
+    def rewards_version(self) -> int:
+        return rewards_version
+
+    def list_rewards(self, category: Optional[str] = None) -> List[dict]:
+        return [r for r in rewards_db if r["is_available"] and (not category or r["category"] == category)]
+
+    def get_reward(self, reward_id: str) -> Optional[dict]:
+        return next((r for r in rewards_db if r["id"] == reward_id), None)
+
+    def _add_user_reward(self, user_id: str, reward_id: str) -> dict:
+        record = {
+            "id": f"user_reward_{user_rewards_db.total + 1}",
+            "user_id": user_id,
+            "reward_id": reward_id,
+            "redeemed_at": datetime.now().isoformat(),
+            "is_used": False
+        }
+        user_rewards_db.append(user_id, record, coin_ledger.append("user_reward", record=record))
+        return record
+
+    def list_user_rewards(self, user_id: str) -> List[dict]:
+        return user_rewards_db.all(user_id)
+
+    def movies_version(self) -> int:
+        return movies_db.version
+
+    def list_movies(self, category: Optional[str] = None) -> List[dict]:
+        return movies_db.list(category)
+
+    def page_movies(self, after: Optional[int], limit: int, category: Optional[str] = None):
+        return movies_db.page(after, limit, category)
+
+    def get_movie(self, movie_id: int) -> Optional[dict]:
+        return movies_db.get(movie_id)
+
+    def create_movie(self, fields: dict) -> dict:
+        movie = {"id": movies_db.allocate_id(), **fields}
+        movies_db.insert(movie)
+        return movie
+
+    def replace_movie(self, movie_id: int, fields: dict) -> Optional[dict]:
+        if movies_db.get(movie_id) is None:
+            return None
+        movie = {"id": movie_id, **fields}
+        movies_db.insert(movie)
+        return movie
+
+    def delete_movie(self, movie_id: int) -> Optional[dict]:
+        return movies_db.delete(movie_id)
+
+    def movie_categories(self) -> List[str]:
+        return movies_db.categories()
+
+    def list_recreation_records(self, category: Optional[str] = None) -> List[dict]:
+        if category:
+            return [video for video in recreation_videos_db if video["category"] == category]
+        return recreation_videos_db
+
+    def add_recreation_record(self, fields: dict) -> dict:
+        record = {"id": max([v["id"] for v in recreation_videos_db], default=0) + 1, **fields}
+        recreation_videos_db.append(record)
+        return record
+
+    def update_recreation_record(self, record_id: int, fields: dict):
+        for video in recreation_videos_db:
+            if video["id"] == record_id:
+                video.update(fields)
+
+    def delete_recreation_record(self, record_id: int) -> Optional[dict]:
+        for i, video in enumerate(recreation_videos_db):
+            if video["id"] == record_id:
+                return recreation_videos_db.pop(i)
+        return None
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY, email TEXT, username TEXT, coins INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_email ON users (email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS users_username ON users (username COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, amount INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL, source TEXT NOT NULL, source_id TEXT, description TEXT,
+    timestamp TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS transactions_user ON transactions (user_id, seq);
+CREATE INDEX IF NOT EXISTS transactions_user_source ON transactions (user_id, source);
+CREATE TABLE IF NOT EXISTS rewards (
+    id TEXT PRIMARY KEY, category TEXT, is_available INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS rewards_category ON rewards (category);
+CREATE TABLE IF NOT EXISTS user_rewards (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, reward_id TEXT NOT NULL,
+    redeemed_at TEXT NOT NULL, is_used INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX IF NOT EXISTS user_rewards_user ON user_rewards (user_id, seq);
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS movies_category ON movies (category, id);
+CREATE TABLE IF NOT EXISTS recreation_videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS recreation_videos_category ON recreation_videos (category, id);
+CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+class SqliteRepository(Repository):
+    """SQLite (WAL) storage shared by every worker process on the host.
+
+    Each thread gets its own connection; statements are fixed strings, so
+    sqlite3's per-connection statement cache prepares each one once. Ids
+    come from AUTOINCREMENT sequences, which never hand out a value twice.
+    """
+
+    blocking = True
+    _TXN_COLUMNS = "seq, user_id, amount, transaction_type, source, source_id, description, timestamp"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SQLITE_SCHEMA)
+        self._seed()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _bump(self, conn: sqlite3.Connection, name: str):
+        conn.execute("INSERT INTO versions (name, value) VALUES (?, 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def _version(self, name: str) -> int:
+        row = self._conn().execute("SELECT value FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _seed(self):
+        # INSERT OR IGNORE on fixed ids, so concurrent workers seed once
+        with self._write() as conn:
+            self._upsert_user(conn, default_user, replace=False)
+            for reward in default_rewards:
+                conn.execute("INSERT OR IGNORE INTO rewards (id, category, is_available, data) VALUES (?, ?, ?, ?)",
+                             (reward["id"], reward["category"], int(reward["is_available"]), json.dumps(reward)))
+            if conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0] == 0:
+                for movie in sample_movies:
+                    conn.execute("INSERT OR IGNORE INTO movies (id, category, data) VALUES (?, ?, ?)",
+                                 (movie["id"], movie.get("category"), json.dumps(movie)))
+
+    def _upsert_user(self, conn: sqlite3.Connection, user: dict, replace: bool = True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        conn.execute(f"{verb} INTO users (id, email, username, coins, version, data) "
+                     "VALUES (?, ?, ?, ?, COALESCE((SELECT version + 1 FROM users WHERE id = ?), 0), ?)",
+                     (user["id"], user.get("email"), user.get("username"), user.get("coins", 0),
+                      user["id"], json.dumps(user)))
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_user(self, user: dict):
+        with self._write() as conn:
+            self._upsert_user(conn, user)
+
+    def _txn_dict(self, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        return {"id": f"txn_{data.pop('seq')}", **data}
+
+    def get_user_for_update(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        row = self._conn().execute("SELECT data, version FROM users WHERE id = ?", (user_id,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def commit_coin_change(self, user: dict, version: int, transactions: List[dict],
+                           reward_ids: List[str]) -> Optional[dict]:
+        user_rewards = []
+        with self._write() as conn:
+            # Compare-and-set on version: a concurrent writer in any process makes this match nothing
+            cur = conn.execute("UPDATE users SET data = ?, coins = ?, email = ?, username = ?, version = version + 1 "
+                               "WHERE id = ? AND version = ?",
+                               (json.dumps(user), user["coins"], user.get("email"), user.get("username"),
+                                user["id"], version))
+            if cur.rowcount == 0:
+                return None
+            for transaction in transactions:
+                cur = conn.execute(
+                    "INSERT INTO transactions (user_id, amount, transaction_type, source, source_id, description, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (transaction["user_id"], transaction["amount"], transaction["transaction_type"], transaction["source"],
+                     transaction.get("source_id"), transaction.get("description"), transaction["timestamp"]))
+                transaction["id"] = f"txn_{cur.lastrowid}"
+            for reward_id in reward_ids:
+                redeemed_at = datetime.now().isoformat()
+                cur = conn.execute("INSERT INTO user_rewards (user_id, reward_id, redeemed_at) VALUES (?, ?, ?)",
+                                   (user["id"], reward_id, redeemed_at))
+                user_rewards.append({"id": f"user_reward_{cur.lastrowid}", "user_id": user["id"],
+                                     "reward_id": reward_id, "redeemed_at": redeemed_at, "is_used": False})
+        return {"user": user, "transactions": transactions, "user_rewards": user_rewards}
+
+    def user_transactions(self, user_id: str, limit: int, before: Optional[str] = None) -> List[dict]:
+        conn = self._conn()
+        if before is None:
+            rows = conn.execute(f"SELECT {self._TXN_COLUMNS} FROM transactions WHERE user_id = ? "
+                                "ORDER BY seq DESC LIMIT ?", (user_id, limit)).fetchall()
+        else:
+            seq = int(before[4:]) if before.startswith("txn_") and before[4:].isdigit() else None
+            if seq is None or conn.execute("SELECT 1 FROM transactions WHERE seq = ? AND user_id = ?",
+                                           (seq, user_id)).fetchone() is None:
+                raise KeyError(before)
+            rows = conn.execute(f"SELECT {self._TXN_COLUMNS} FROM transactions WHERE user_id = ? AND seq < ? "
+                                "ORDER BY seq DESC LIMIT ?", (user_id, seq, limit)).fetchall()
+        return [self._txn_dict(row) for row in rows]
+
+    def count_transactions(self, user_id: str, source: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM transactions WHERE user_id = ? AND source = ?",
+                                    (user_id, source)).fetchone()[0]
+
+    def rewards_version(self) -> int:
+        return self._version("rewards")
+
+    def list_rewards(self, category: Optional[str] = None) -> List[dict]:
+        if category:
+            rows = self._conn().execute("SELECT data FROM rewards WHERE is_available = 1 AND category = ? ORDER BY rowid",
+                                        (category,)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT data FROM rewards WHERE is_available = 1 ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_reward(self, reward_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM rewards WHERE id = ?", (reward_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_user_rewards(self, user_id: str) -> List[dict]:
+        rows = self._conn().execute("SELECT seq, user_id, reward_id, redeemed_at, is_used FROM user_rewards "
+                                    "WHERE user_id = ? ORDER BY seq", (user_id,)).fetchall()
+        return [{"id": f"user_reward_{row['seq']}", "user_id": row["user_id"], "reward_id": row["reward_id"],
+                 "redeemed_at": row["redeemed_at"], "is_used": bool(row["is_used"])} for row in rows]
+
+    def movies_version(self) -> int:
+        return self._version("movies")
+
+    def list_movies(self, category: Optional[str] = None) -> List[dict]:
+        if category:
+            rows = self._conn().execute("SELECT data FROM movies WHERE category = ? ORDER BY id", (category,)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT data FROM movies ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def page_movies(self, after: Optional[int], limit: int, category: Optional[str] = None):
+        after = -1 if after is None else after
+        if category:
+            rows = self._conn().execute("SELECT id, data FROM movies WHERE category = ? AND id > ? ORDER BY id LIMIT ?",
+                                        (category, after, limit + 1)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT id, data FROM movies WHERE id > ? ORDER BY id LIMIT ?",
+                                        (after, limit + 1)).fetchall()
+        page = rows[:limit]
+        next_after = page[-1]["id"] if page and len(rows) > limit else None
+        return [json.loads(row["data"]) for row in page], next_after
+
+    def get_movie(self, movie_id: int) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM movies WHERE id = ?", (movie_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_movie(self, fields: dict) -> dict:
+        with self._write() as conn:
+            cur = conn.execute("INSERT INTO movies (category, data) VALUES (?, '{}')", (fields.get("category"),))
+            movie = {"id": cur.lastrowid, **fields}
+            conn.execute("UPDATE movies SET data = ? WHERE id = ?", (json.dumps(movie), movie["id"]))
+            self._bump(conn, "movies")
+        return movie
+
+    def replace_movie(self, movie_id: int, fields: dict) -> Optional[dict]:
+        movie = {"id": movie_id, **fields}
+        with self._write() as conn:
+            cur = conn.execute("UPDATE movies SET category = ?, data = ? WHERE id = ?",
+                               (fields.get("category"), json.dumps(movie), movie_id))
+            if cur.rowcount == 0:
+                return None
+            self._bump(conn, "movies")
+        return movie
+
+    def delete_movie(self, movie_id: int) -> Optional[dict]:
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM movies WHERE id = ?", (movie_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM movies WHERE id = ?", (movie_id,))
+            self._bump(conn, "movies")
+        return json.loads(row[0])
+
+    def movie_categories(self) -> List[str]:
+        rows = self._conn().execute("SELECT category FROM movies WHERE category IS NOT NULL "
+                                    "GROUP BY category ORDER BY MIN(id)").fetchall()
+        return [row[0] for row in rows]
+
+    def list_recreation_records(self, category: Optional[str] = None) -> List[dict]:
+        if category:
+            rows = self._conn().execute("SELECT data FROM recreation_videos WHERE category = ? ORDER BY id",
+                                        (category,)).fetchall()
+        else:
+            rows = self._conn().execute("SELECT data FROM recreation_videos ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add_recreation_record(self, fields: dict) -> dict:
+        with self._write() as conn:
+            cur = conn.execute("INSERT INTO recreation_videos (category, data) VALUES (?, '{}')", (fields.get("category"),))
+            record = {"id": cur.lastrowid, **fields}
+            conn.execute("UPDATE recreation_videos SET data = ? WHERE id = ?", (json.dumps(record), record["id"]))
+        return record
+
+    def update_recreation_record(self, record_id: int, fields: dict):
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM recreation_videos WHERE id = ?", (record_id,)).fetchone()
+            if row is not None:
+                record = {**json.loads(row[0]), **fields}
+                conn.execute("UPDATE recreation_videos SET data = ? WHERE id = ?", (json.dumps(record), record_id))
+
+    def delete_recreation_record(self, record_id: int) -> Optional[dict]:
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM recreation_videos WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM recreation_videos WHERE id = ?", (record_id,))
+        return json.loads(row[0])
+
+def _create_storage() -> Repository:
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteRepository(SQLITE_PATH)
+    if STORAGE_BACKEND != "memory":
+        print(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}, using memory")
+    return MemoryRepository()
+
+storage = _create_storage()
+
+async def run_storage(fn, *args, **kwargs):
+    """Call fn, a storage method or code built on one, without blocking the
+    event loop: in a worker thread for a blocking backend, inline otherwise."""
+    if storage.blocking:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+# Grid posters are requested as resized variants (see /img, paths under static/images)
+POSTER_VARIANT = os.environ.get("POSTER_VARIANT", "480x270")
+
+def _poster_variant(path: str) -> str:
+    return f"/img/{POSTER_VARIANT}/{path}"
+
+# Seed simple frontend videos list from sample movies so React UI has data
+if not frontend_videos:
+    for m in storage.list_movies():
+        frontend_videos.append(FrontendVideo(
+            id=str(m["id"]),
+            title=m["title"],
+            description=m["description"],
+            category=(m.get("category") or "General").title(),
+            duration=m.get("duration") or "",
+            poster_url=m.get("poster_url"),
+            video_url=None,
+            created_at=datetime.now().isoformat()
+        ))
+    
+    # Add some audio content for the React app
+    frontend_videos.extend([
+        FrontendVideo(
+            id="audio_1",
+            title="Healing Meditation",
+            description="Relaxing sounds for meditation and stress relief.",
+            category="Audio",
+            duration="5:00",
+            poster_url=_poster_variant("song_thumbnails/healing_meditation_thumb.jpg"),
+            video_url="/static/songs/432hz-healing-meditation-396482.mp3",
+            created_at=datetime.now().isoformat()
+        ),
+        FrontendVideo(
+            id="audio_2",
+            title="Nature Sounds",
+            description="Soothing nature sounds for sleep and relaxation.",
+            category="Audio",
+            duration="10:00",
+            poster_url=_poster_variant("song_thumbnails/nature_meditation_thumb.jpg"),
+            video_url="/static/songs/nature-sounds-slow-meditation-healing-frequency-432hz-368787.mp3",
+            created_at=datetime.now().isoformat()
+        ),
+        FrontendVideo(
+            id="audio_3",
+            title="Alpha Music",
+            description="432Hz frequency music for deep focus and meditation.",
+            category="Audio",
+            duration="8:00",
+            poster_url=_poster_variant("song_thumbnails/alpha_music_thumb.jpg"),
+            video_url="/static/songs/alpha-music-432hz-the-first-314853.mp3",
+            created_at=datetime.now().isoformat()
+        )
+    ])
+
+# --------------------
+# Media metadata probing
+# --------------------
+# Header-only duration readers. They seek past payload data (mdat, clusters,
+# audio frames) and never decode, so they are cheap even on large files.
+EBML_HEADER = 0x1A45DFA3
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_CLUSTER = 0x1F43B675
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+def _probe_mp4(f, size: int) -> Optional[float]:
+    """Duration from moov/mvhd (MP4, MOV, M4A)."""
+    def walk(start: int, end: int) -> Optional[float]:
+        pos = start
+        while pos + 8 <= end:
+            f.seek(pos)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            header_len = 8
+            if box_size == 1:
+                box_size = struct.unpack(">Q", f.read(8))[0]
+                header_len = 16
+            elif box_size == 0:
+                box_size = end - pos
+            if box_size < header_len:
+                return None
+            if box_type == b"moov":
+                return walk(pos + header_len, pos + box_size)
+            if box_type == b"mvhd":
+                data = f.read(32)
+                if data[0] == 1:
+                    timescale, duration = struct.unpack(">IQ", data[20:32])
+                else:
+                    timescale, duration = struct.unpack(">II", data[12:20])
+                return duration / timescale if timescale else None
+            pos += box_size
+        return None
+    return walk(0, size)
+
+def _read_ebml_vint(f, keep_marker: bool) -> Tuple[int, bool]:
+    first = f.read(1)
+    if not first:
+        raise EOFError
+    mask, length = 0x80, 1
+    while length <= 8 and not first[0] & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML vint")
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for b in f.read(length - 1):
+        value = (value << 8) | b
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+def _probe_ebml(f, size: int) -> Optional[float]:
+    """Duration from Segment/Info (WebM, Matroska)."""
+    scale, duration = 1000000, None
+    f.seek(0)
+    if _read_ebml_vint(f, True)[0] != EBML_HEADER:
+        return None
+    header_size, _ = _read_ebml_vint(f, False)
+    f.seek(header_size, os.SEEK_CUR)
+    while f.tell() < size:
+        elem_id, _ = _read_ebml_vint(f, True)
+        elem_size, unknown = _read_ebml_vint(f, False)
+        if elem_id == EBML_SEGMENT:
+            end = size if unknown else min(size, f.tell() + elem_size)
+            while f.tell() < end:
+                child_id, _ = _read_ebml_vint(f, True)
+                child_size, child_unknown = _read_ebml_vint(f, False)
+                if child_id == EBML_INFO:
+                    info_end = f.tell() + child_size
+                    while f.tell() < info_end:
+                        field_id, _ = _read_ebml_vint(f, True)
+                        field_size, _ = _read_ebml_vint(f, False)
+                        data = f.read(field_size)
+                        if field_id == EBML_TIMECODE_SCALE:
+                            scale = int.from_bytes(data, "big")
+                        elif field_id == EBML_DURATION:
+                            duration = struct.unpack(">f" if field_size == 4 else ">d", data)[0]
+                    return duration * scale / 1e9 if duration is not None else None
+                if child_unknown or child_id == EBML_CLUSTER:
+                    # Info always precedes the media clusters
+                    return None
+                f.seek(child_size, os.SEEK_CUR)
+            return None
+        if unknown:
+            return None
+        f.seek(elem_size, os.SEEK_CUR)
+    return None
+
+def _probe_mp3(f, size: int) -> Optional[float]:
+    """Duration from the Xing/Info or VBRI frame count, else from the CBR bitrate."""
+    f.seek(0)
+    start = 0
+    head = f.read(10)
+    if head[:3] == b"ID3" and len(head) == 10:
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(start)
+    buf = f.read(65536)
+    for i in range(len(buf) - 4):
+        if buf[i] != 0xFF or buf[i + 1] & 0xE0 != 0xE0:
+            continue
+        b1, b2, b3 = buf[i + 1], buf[i + 2], buf[i + 3]
+        version = {0: 25, 2: 2, 3: 1}.get((b1 >> 3) & 3)
+        layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 3)
+        bitrate_idx, rate_idx = b2 >> 4, (b2 >> 2) & 3
+        if version is None or layer is None or bitrate_idx in (0, 15) or rate_idx == 3:
+            continue
+        bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_idx] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_idx]
+        samples = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+        mono = (b3 >> 6) == 3
+        side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+        frame = buf[i:i + 4 + 32 + 18]
+        xing = frame[4 + side_info:4 + side_info + 12]
+        if xing[:4] in (b"Xing", b"Info") and struct.unpack(">I", xing[4:8])[0] & 1:
+            return struct.unpack(">I", xing[8:12])[0] * samples / sample_rate
+        if frame[36:40] == b"VBRI":
+            return struct.unpack(">I", frame[50:54])[0] * samples / sample_rate
+        audio_bytes = size - (start + i)
+        f.seek(max(0, size - 128))
+        if f.read(3) == b"TAG":
+            audio_bytes -= 128
+        return audio_bytes * 8 / bitrate
+    return None
+
+def _probe_wav(f, size: int) -> Optional[float]:
+    """Duration from the fmt byte rate and the data chunk size."""
+    f.seek(12)
+    byte_rate, data_size = None, None
+    while f.tell() + 8 <= size and (byte_rate is None or data_size is None):
+        chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<I", f.read(16)[8:12])[0]
+            f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+        else:
+            if chunk_id == b"data":
+                data_size = chunk_size
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    if not byte_rate or data_size is None:
+        return None
+    return data_size / byte_rate
+
+def _probe_ogg(f, size: int) -> Optional[float]:
+    """Duration from the last page's granule position (Vorbis, Opus)."""
+    f.seek(0)
+    page = f.read(27)
+    if page[:4] != b"OggS":
+        return None
+    segments = f.read(page[26])
+    packet = f.read(sum(segments))
+    if packet[:7] == b"\x01vorbis":
+        rate, pre_skip = struct.unpack("<I", packet[12:16])[0], 0
+    elif packet[:8] == b"OpusHead":
+        rate, pre_skip = 48000, struct.unpack("<H", packet[10:12])[0]
+    else:
+        return None
+    tail_len = min(size, 65307)
+    f.seek(size - tail_len)
+    tail = f.read(tail_len)
+    last = tail.rfind(b"OggS")
+    if last < 0 or not rate:
+        return None
+    granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+    return max(0, granule - pre_skip) / rate
+
+def _media_format(magic: bytes) -> Optional[str]:
+    """Container format from the first 12 bytes of a file."""
+    if magic[:4] == b"\x1a\x45\xdf\xa3":
+        return "ebml"
+    if magic[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide"):
+        return "mp4"
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WAVE":
+        return "wav"
+    if magic[:4] == b"OggS":
+        return "ogg"
+    if magic[:3] == b"ID3" or (len(magic) > 1 and magic[0] == 0xFF and magic[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+_MEDIA_PROBES = {
+    "ebml": _probe_ebml,
+    "mp4": _probe_mp4,
+    "wav": _probe_wav,
+    "ogg": _probe_ogg,
+    "mp3": _probe_mp3,
+}
+
+def probe_media(path: str) -> Optional[float]:
+    """Duration of a media file in seconds, or None if it cannot be read.
+
+    Runs in the probe process pool, so it only touches its own arguments.
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            reader = _MEDIA_PROBES.get(_media_format(f.read(12)))
+            if reader is not None:
+                return reader(f, size)
+    except Exception:
+        return None
+    return None
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    total = int(seconds + 0.5)
+    hours, rem = divmod(total, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+MEDIA_PROBE_WORKERS = int(os.environ.get("MEDIA_PROBE_WORKERS", "2"))
+# (path, size, mtime_ns) -> seconds; unchanged files are never parsed twice
+media_probe_cache: Dict[Tuple[str, int, int], Optional[float]] = {}
+# Catalog id -> cache key still waiting for a probe
+media_probe_pending: Dict[str, Tuple[str, int, int]] = {}
+_probe_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_probe_pool() -> ProcessPoolExecutor:
+    global _probe_pool
+    if _probe_pool is None:
+        _probe_pool = ProcessPoolExecutor(max_workers=max(1, MEDIA_PROBE_WORKERS))
+    return _probe_pool
+
+async def probe_media_cached(path: str) -> Optional[float]:
+    """Probe path in the process pool, consulting the (path, size, mtime) cache first."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in media_probe_cache:
+        loop = asyncio.get_running_loop()
+        media_probe_cache[key] = await loop.run_in_executor(_get_probe_pool(), probe_media, path)
+    return media_probe_cache[key]
+
+# Auto-index local media from static/videos and static/songs
+def _safe_title_from_filename(filename: str) -> str:
+    base = os.path.splitext(os.path.basename(filename))[0]
+    # Replace separators with spaces and normalize
+    return re.sub(r"[_-]+", " ", base).strip().title()
+
+VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".mkv"}
+SONG_EXTENSIONS = {".mp3", ".wav", ".aac", ".ogg", ".m4a"}
+VIDEOS_DIR = os.path.join("static", "videos")
+SONGS_DIR = os.path.join("static", "songs")
+THUMBS_DIR = os.path.join("static", "images", "thumbnails")
+# Seconds between background rescans of the media directories
+MEDIA_RESCAN_INTERVAL = float(os.environ.get("MEDIA_RESCAN_INTERVAL", "15"))
+
+# Scanner state. Per-directory listings are reused while the directory mtime
+# is unchanged; media_files maps catalog id -> (directory kind, name, inode,
+# size, mtime_ns).
+media_dir_cache: Dict[str, Tuple[int, Dict[str, Tuple[int, int, int]]]] = {}
+media_files: Dict[str, Tuple[str, str, int, int, int]] = {}
+media_indexer_status: Dict[str, Any] = {
+    "scans": 0,
+    "last_scan_started": None,
+    "last_scan_finished": None,
+    "last_scan_ms": 0.0,
+    "added": 0,
+    "removed": 0,
+    "renamed": 0,
+    "last_error": None,
+}
+
+def _scan_dir(path: str, extensions: Optional[Set[str]] = None) -> Dict[str, Tuple[int, int, int]]:
+    """name -> (inode, size, mtime_ns) for a directory, reusing the previous
+    listing when the directory's own mtime has not moved.
+
+    A reused listing still has each file re-stat'ed, since rewriting a file in
+    place changes its size/mtime but not the directory's."""
+    try:
+        dir_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        media_dir_cache.pop(path, None)
+        return {}
+    cached = media_dir_cache.get(path)
+    if cached is not None and cached[0] == dir_mtime:
+        entries = {}
+        for name in cached[1]:
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            entries[name] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        media_dir_cache[path] = (dir_mtime, entries)
+        return entries
+    entries: Dict[str, Tuple[int, int, int]] = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            entries[entry.name] = (st.st_ino, st.st_size, st.st_mtime_ns)
+    media_dir_cache[path] = (dir_mtime, entries)
+    return entries
+
+def _scan_media_dirs() -> Dict[str, Dict[str, Tuple[int, int, int]]]:
+    """Blocking filesystem pass; safe to run in a worker thread."""
+    return {
+        "videos": _scan_dir(VIDEOS_DIR, VIDEO_EXTENSIONS),
+        "songs": _scan_dir(SONGS_DIR, SONG_EXTENSIONS),
+        "thumbs": _scan_dir(THUMBS_DIR),
+    }
+
+def _video_poster(name: str, thumbs: Dict[str, Any]) -> Optional[str]:
+    # Try to find a matching thumbnail in static/images/thumbnails
+    base = os.path.splitext(name)[0]
+    for t in (f"{base}_thumb.jpg", f"{base}.jpg", f"{base}.png"):
+        if t in thumbs:
+            return _poster_variant(f"thumbnails/{t}")
+    return None
+
+def _song_poster(name: str) -> str:
+    # Try to map thumbnails by simple heuristics
+    lower = name.lower()
+    thumb_map = [
+        ("alpha", "song_thumbnails/alpha_music_thumb.jpg"),
+        ("nature", "song_thumbnails/nature_meditation_thumb.jpg"),
+        ("comfort", "song_thumbnails/comfort_sounds_thumb.jpg"),
+        ("healing", "song_thumbnails/healing_meditation_thumb.jpg"),
+    ]
+    for key, path in thumb_map:
+        if key in lower:
+            return _poster_variant(path)
+    return _poster_variant("song_thumbnails/meditation_thumb.jpg")
+
+def _media_entry(kind: str, name: str, thumbs: Dict[str, Any], created_at: Optional[str] = None) -> FrontendVideo:
+    if kind == "videos":
+        return FrontendVideo(
+            id=f"vid_{name}",
+            title=_safe_title_from_filename(name),
+            description=None,
+            category="Videos",
+            duration="",
+            poster_url=_video_poster(name, thumbs),
+            video_url=f"/media/videos/{name}",
+            created_at=created_at or datetime.now().isoformat()
+        )
+    # Songs (as Audio category)
+    return FrontendVideo(
+        id=f"audio_{name}",
+        title=_safe_title_from_filename(name),
+        description=None,
+        category="Audio",
+        duration="",
+        poster_url=_song_poster(name),
+        video_url=f"/media/songs/{name}",
+        created_at=created_at or datetime.now().isoformat()
+    )
+
+def _apply_media_scan(scan: Dict[str, Dict[str, Tuple[int, int, int]]]):
+    """Bring frontend_videos and the search index in line with a scan.
+
+    Only the differences are applied. A removed file whose inode shows up
+    under a new name in the same directory is treated as a rename and keeps
+    its original created_at.
+    """
+    thumbs = scan["thumbs"]
+    for kind, prefix in (("videos", "vid_"), ("songs", "audio_")):
+        current = scan[kind]
+        directory = VIDEOS_DIR if kind == "videos" else SONGS_DIR
+        known = {name: (vid_id, inode) for vid_id, (k, name, inode, _, _) in media_files.items() if k == kind}
+        for name, (vid_id, _inode) in known.items():
+            if name in current and media_files[vid_id][3:] != current[name][1:]:
+                # Content changed in place: refresh the duration
+                media_files[vid_id] = (kind, name, *current[name])
+                _queue_media_probe(vid_id, os.path.join(directory, name), current[name])
+        removed = {name: v for name, v in known.items() if name not in current}
+        added = [name for name in current if name not in known and f"{prefix}{name}" not in frontend_videos]
+        removed_by_inode = {inode: (name, vid_id) for name, (vid_id, inode) in removed.items()}
+        for name in added:
+            inode = current[name][0]
+            created_at = None
+            renamed_from = removed_by_inode.pop(inode, None)
+            if renamed_from is not None:
+                old_name, old_id = renamed_from
+                old = frontend_videos.remove(old_id)
+                _unindex_frontend_video(old_id)
+                media_files.pop(old_id, None)
+                del removed[old_name]
+                created_at = old.created_at if old is not None else None
+                media_indexer_status["renamed"] += 1
+            else:
+                media_indexer_status["added"] += 1
+            video = _media_entry(kind, name, thumbs, created_at)
+            frontend_videos.append(video)
+            _index_frontend_video(video)
+            media_files[video.id] = (kind, name, *current[name])
+            _queue_media_probe(video.id, os.path.join(directory, name), current[name])
+        for name, (vid_id, _inode) in removed.items():
+            frontend_videos.remove(vid_id)
+            _unindex_frontend_video(vid_id)
+            media_files.pop(vid_id, None)
+            media_indexer_status["removed"] += 1
+
+def _queue_media_probe(video_id: str, path: str, stat: Tuple[int, int, int]):
+    key = (path, stat[1], stat[2])
+    if key in media_probe_cache:
+        _set_media_duration(video_id, media_probe_cache[key])
+    else:
+        media_probe_pending[video_id] = key
+
+def _set_media_duration(video_id: str, seconds: Optional[float]):
+    video = frontend_videos.get(video_id)
+    duration = _format_duration(seconds)
+    if video is not None and duration and video.duration != duration:
+        frontend_videos.append(video.copy(update={"duration": duration}))
+
+async def _run_media_probes():
+    """Fill in durations for everything queued by the indexer, in the process pool."""
+    loop = asyncio.get_running_loop()
+    pending = dict(media_probe_pending)
+    media_probe_pending.clear()
+    by_key: Dict[Tuple[str, int, int], List[str]] = {}
+    for video_id, key in pending.items():
+        by_key.setdefault(key, []).append(video_id)
+    keys = list(by_key)
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_get_probe_pool(), probe_media, key[0]) for key in keys),
+        return_exceptions=True,
+    )
+    for key, seconds in zip(keys, results):
+        if isinstance(seconds, BaseException):
+            seconds = None
+        media_probe_cache[key] = seconds
+        for video_id in by_key[key]:
+            _set_media_duration(video_id, seconds)
+
+def index_static_media():
+    try:
+        started = datetime.now()
+        media_indexer_status["last_scan_started"] = started.isoformat()
+        _apply_media_scan(_scan_media_dirs())
+        _finish_media_scan(started)
+    except Exception as e:
+        # Non-fatal: keep app running even if indexing fails
+        media_indexer_status["last_error"] = str(e)
+
+def _finish_media_scan(started: datetime):
+    finished = datetime.now()
+    media_indexer_status["scans"] += 1
+    media_indexer_status["last_scan_finished"] = finished.isoformat()
+    media_indexer_status["last_scan_ms"] = round((finished - started).total_seconds() * 1000, 2)
+    media_indexer_status["last_error"] = None
+
+async def _media_indexer_loop():
+    """Rescan the media directories every MEDIA_RESCAN_INTERVAL seconds.
+
+    The filesystem pass runs in the default executor; the deltas are applied
+    on the event loop so request handlers never see a half-updated catalog.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(MEDIA_RESCAN_INTERVAL)
+        try:
+            started = datetime.now()
+            media_indexer_status["last_scan_started"] = started.isoformat()
+            scan = await loop.run_in_executor(None, _scan_media_dirs)
+            _apply_media_scan(scan)
+            _finish_media_scan(started)
+            if media_probe_pending:
+                await _run_media_probes()
+        except Exception as e:
+            media_indexer_status["last_error"] = str(e)
+
+# Build the search index over the seeded catalog, then index local media
+# (index_static_media adds what it finds to the search index incrementally)
+rebuild_search_index()
+index_static_media()
+
+media_indexer_task: Optional[asyncio.Task] = None
+media_probe_task: Optional[asyncio.Task] = None
+
+def _media_probe_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        media_indexer_status["last_error"] = str(task.exception())
+        print(f"Media probe failed: {task.exception()}")
+
+@app.on_event("startup")
+async def start_media_indexer():
+    global media_indexer_task, media_probe_task
+    if MEDIA_RESCAN_INTERVAL > 0:
+        media_indexer_task = asyncio.create_task(_media_indexer_loop())
+    # Durations for media found by the synchronous startup scan
+    if media_probe_pending:
+        media_probe_task = asyncio.create_task(_run_media_probes())
+        media_probe_task.add_done_callback(_media_probe_done)
+
+@app.on_event("shutdown")
+async def stop_media_indexer():
+    global _probe_pool
+    for task in (media_indexer_task, media_probe_task):
+        if task is not None:
+            task.cancel()
+    if _probe_pool is not None:
+        _probe_pool.shutdown(wait=False, cancel_futures=True)
+        _probe_pool = None
+
+@app.get("/api/indexer/status")
+async def media_indexer_state():
+    """Background media indexer progress; lag_seconds is the age of the last completed scan."""
+    finished = media_indexer_status["last_scan_finished"]
+    lag = (datetime.now() - datetime.fromisoformat(finished)).total_seconds() if finished else None
+    return {
+        **media_indexer_status,
+        "interval_seconds": MEDIA_RESCAN_INTERVAL,
+        "running": media_indexer_task is not None and not media_indexer_task.done(),
+        "indexed_files": len(media_files),
+        "pending_probes": len(media_probe_pending),
+        "lag_seconds": round(lag, 3) if lag is not None else None,
+    }
+
+# ---------- Media delivery ----------
+# /media/<kind>/<name> serves songs and videos with byte ranges. Bodies go out
+# through the ASGI zero-copy extension (os.sendfile in the server) when the
+# server offers it, otherwise as os.pread chunks off the event loop.
+MEDIA_CHUNK_SIZE = 256 * 1024
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+MEDIA_MAX_STREAMS_PER_CLIENT = int(os.environ.get("MEDIA_MAX_STREAMS_PER_CLIENT", "6"))
+MEDIA_MAX_RANGES = 16
+MEDIA_TYPES = {
+    ".mp4": "video/mp4", ".m4a": "audio/mp4", ".webm": "video/webm", ".mkv": "video/x-matroska",
+    ".mov": "video/quicktime", ".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg", ".aac": "audio/aac",
+}
+
+media_streams: Dict[str, int] = {}
+
+def _media_root(kind: str) -> Optional[str]:
+    return {"videos": VIDEOS_DIR, "songs": SONGS_DIR, "recreation": RECREATION_DIR}.get(kind)
+
+def _parse_ranges(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """(start, end) inclusive byte ranges from a Range header.
+
+    Returns None when the header should be ignored (not bytes, malformed or
+    too many ranges) and [] when nothing in it is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges: List[Tuple[int, int]] = []
+    parts = spec.split(",")
+    if len(parts) > MEDIA_MAX_RANGES:
+        return None
+    for part in parts:
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if end is None:
+            end = size - 1
+        elif start > end:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
+class MediaFileResponse(Response):
+    """Sends (prefix, offset, count) parts of an open file."""
+
+    def __init__(self, file, parts: List[Tuple[bytes, int, int]], trailer: bytes, status_code: int,
+                 headers: Dict[str, str], client: str, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.file = file
+        self.parts = parts
+        self.trailer = trailer
+        self.client = client
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self.send_body:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+            for prefix, offset, count in self.parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zero_copy:
+                    await send({"type": "http.response.zerocopysend", "file": self.file,
+                                "offset": offset, "count": count, "more_body": True})
+                    continue
+                end = offset + count
+                while offset < end:
+                    chunk = await asyncio.to_thread(os.pread, self.file.fileno(), min(MEDIA_CHUNK_SIZE, end - offset), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            self.file.close()
+            _release_media_stream(self.client)
+
+def _release_media_stream(client: str):
+    media_streams[client] = media_streams.get(client, 1) - 1
+    if media_streams[client] <= 0:
+        media_streams.pop(client, None)
+
+@app.api_route("/media/{kind}/{name:path}", methods=["GET", "HEAD"])
+async def serve_media(kind: str, name: str, request: Request):
+    """Song/video bytes with Range support (single and multipart), ETag and long-lived caching."""
+    root = _media_root(kind)
+    if root is None or os.path.splitext(name)[1].lower() not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Media not found")
+    base = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(base, name))
+    if not path.startswith(base + os.sep):
+        raise HTTPException(status_code=404, detail="Media not found")
+    try:
+        file = open(path, "rb", buffering=0)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Media not found")
+    try:
+        stat = os.fstat(file.fileno())
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={MEDIA_CACHE_MAX_AGE}",
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            file.close()
+            return Response(status_code=304, headers=headers)
+
+        ranges = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            ranges = _parse_ranges(range_header, size)
+        if ranges == []:
+            file.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+        client = request.client.host if request.client else "unknown"
+        if media_streams.get(client, 0) >= MEDIA_MAX_STREAMS_PER_CLIENT:
+            file.close()
+            return Response(status_code=429, headers={"Retry-After": "1"})
+
+        media_type = MEDIA_TYPES[os.path.splitext(name)[1].lower()]
+        trailer = b""
+        if ranges is None:
+            status_code = 200
+            parts = [(b"", 0, size)]
+            headers["Content-Type"] = media_type
+            headers["Content-Length"] = str(size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            status_code = 206
+            parts = [(b"", start, end - start + 1)]
+            headers["Content-Type"] = media_type
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+        else:
+            status_code = 206
+            boundary = uuid.uuid4().hex
+            parts = []
+            for i, (start, end) in enumerate(ranges):
+                # Each part after the first starts with the CRLF that ends the previous body
+                prefix = (("\r\n" if i else "") + f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                          f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("latin-1")
+                parts.append((prefix, start, end - start + 1))
+            trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+            headers["Content-Length"] = str(sum(len(prefix) + count for prefix, _, count in parts) + len(trailer))
+    except BaseException:
+        file.close()
+        raise
+
+    media_streams[client] = media_streams.get(client, 0) + 1
+    return MediaFileResponse(file, parts, trailer, status_code, headers, client,
+                             send_body=request.method != "HEAD")
+
+# ---------- Image variants ----------
+# /img/<w>x<h>/<path under static/images> returns the image scaled to fit the
+# box (never enlarged). Each variant is rendered once with Pillow, kept in a
+# byte-bounded LRU directory, and small recent ones are also held in memory.
+# Without Pillow the original image is served.
+IMAGES_DIR = os.path.join("static", "images")
+IMAGE_CACHE_DIR = os.path.join("data", "img_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+IMAGE_HOT_ITEMS = 128
+IMAGE_HOT_MAX_ITEM_BYTES = 256 * 1024
+IMAGE_MAX_DIM = 2048
+IMAGE_FORMATS = {".jpg": ("JPEG", "image/jpeg"), ".jpeg": ("JPEG", "image/jpeg"),
+                 ".png": ("PNG", "image/png"), ".webp": ("WEBP", "image/webp")}
+
+class ImageVariantCache:
+    """Rendered variants on disk under a byte budget, evicted least recently
+    used, plus an in-memory hot set. Concurrent misses for the same variant
+    share one render."""
+
+    def __init__(self, directory: str, max_bytes: int, hot_items: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hot: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hot_items = hot_items
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.renders = 0
+        self.evictions = 0
+
+    def load(self):
+        """Index variants left by a previous run, oldest access first."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.files.clear()
+        self.total_bytes = 0
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.files[name] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remember(self, name: str, data: bytes):
+        if len(data) <= IMAGE_HOT_MAX_ITEM_BYTES:
+            self.hot[name] = data
+            self.hot.move_to_end(name)
+            while len(self.hot) > self.hot_items:
+                self.hot.popitem(last=False)
+
+    def _add(self, name: str, size: int):
+        self.total_bytes += size - self.files.pop(name, 0)
+        self.files[name] = size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.total_bytes -= size
+            self.hot.pop(name, None)
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    async def get(self, name: str, render) -> bytes:
+        """Bytes for variant `name`; render(path) writes it on a miss and returns the bytes."""
+        data = self.hot.get(name)
+        if data is not None and name in self.files:
+            self.hot.move_to_end(name)
+            self.files.move_to_end(name)
+            return data
+        if name in self.files:
+            self.files.move_to_end(name)
+            try:
+                data = await asyncio.to_thread(_read_file, self._path(name))
+                self._remember(name, data)
+                return data
+            except OSError:
+                self.total_bytes -= self.files.pop(name, 0)
+        pending = self.inflight.get(name)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[name] = future
+        try:
+            data = await asyncio.to_thread(render, self._path(name))
+            self.renders += 1
+            self._add(name, len(data))
+            self._remember(name, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters (if any) get the error; don't warn when there are none
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.files),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "renders": self.renders,
+            "evictions": self.evictions,
+            "hot_items": len(self.hot),
+        }
+
+image_cache = ImageVariantCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_HOT_ITEMS)
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _render_image_variant(src: str, dest: str, width: int, height: int, fmt: str) -> bytes:
+    from PIL import Image
+    with Image.open(src) as img:
+        img.thumbnail((width, height))
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp = f"{dest}.tmp"
+        img.save(tmp, fmt, quality=82, optimize=True)
+    os.replace(tmp, dest)
+    return _read_file(dest)
+
+def _pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+IMAGE_RESIZE_ENABLED = _pillow_available()
+
+@app.on_event("startup")
+async def load_image_cache():
+    image_cache.load()
+
+@app.get("/img/{size}/{path:path}")
+async def image_variant(size: str, path: str, request: Request):
+    """An image from static/images scaled to fit within <w>x<h>."""
+    match = re.fullmatch(r"(\d{1,4})x(\d{1,4})", size)
+    if not match:
+        raise HTTPException(status_code=404, detail="Image not found")
+    width, height = int(match.group(1)), int(match.group(2))
+    if not (0 < width <= IMAGE_MAX_DIM and 0 < height <= IMAGE_MAX_DIM):
+        raise HTTPException(status_code=400, detail=f"Dimensions must be between 1 and {IMAGE_MAX_DIM}")
+    ext = os.path.splitext(path)[1].lower()
+    base = os.path.realpath(IMAGES_DIR)
+    src = os.path.realpath(os.path.join(base, path))
+    if ext not in IMAGE_FORMATS or not src.startswith(base + os.sep) or not os.path.isfile(src):
+        raise HTTPException(status_code=404, detail="Image not found")
+    stat = os.stat(src)
+    headers = {"Cache-Control": f"public, max-age={MEDIA_CACHE_MAX_AGE}"}
+    if not IMAGE_RESIZE_ENABLED:
+        return FileResponse(src, headers=headers)
+
+    fmt, media_type = IMAGE_FORMATS[ext]
+    # Variant name covers the source version, so edited images get new variants
+    digest = hashlib.sha1(f"{path}|{width}x{height}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+    etag = f'"img-{digest[:20]}"'
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await image_cache.get(f"{digest}{ext}", lambda dest: _render_image_variant(src, dest, width, height, fmt))
+    except Exception as e:
+        print(f"Image resize failed for {path}: {e}")
+        headers.pop("ETag")
+        return FileResponse(src, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+@app.get("/api/img/cache-stats")
+async def image_cache_stats():
+    return {"resize_enabled": IMAGE_RESIZE_ENABLED, **image_cache.stats()}
+
+# ---------- SPA shell and assets ----------
+# index.html is kept in memory (plain and gzipped) and reloaded when the file
+# changes. Files under SPA_ASSETS get .gz/.br siblings built once at startup
+# (or taken from the build if it already emitted them); requests pick one by
+# Accept-Encoding, so nothing is compressed per request. A new index.html
+# triggers a rebuild of the asset index, and a file that is not indexed yet
+# is looked up on disk and added on first request.
+SPA_INDEX_CHECK_INTERVAL = 1.0
+SPA_COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".wasm"}
+SPA_COMPRESS_MIN_BYTES = 1024
+SPA_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Without a build manifest, fall back to Vite's default file names,
+# <name>-<8-char base64url hash>.<ext>. Requiring a digit or capital in the
+# hash keeps plain words (logo-settings.png) out; a real hash without one
+# just loses the long cache lifetime.
+_HASHED_ASSET_RE = re.compile(
+    r"-(?=[A-Za-z0-9_-]{0,7}[0-9A-Z])[A-Za-z0-9_-]{8}"
+    r"\.(?:js|mjs|css|png|jpe?g|gif|svg|webp|avif|ico|woff2?|ttf|otf|eot|wasm|mp3|mp4|webm|ogg|wav)(?:\.map)?$"
+)
+# Written by `vite build` with build.manifest enabled (Vite 5 path first)
+SPA_MANIFESTS = (os.path.join(SPA_DIR, ".vite", "manifest.json"), os.path.join(SPA_DIR, "manifest.json"))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _accepted_encodings(header: Optional[str]) -> Set[str]:
+    accepted: Set[str] = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")])
+
+class SpaIndex:
+    """index.html held in memory; the file is re-stat'ed at most once per
+    SPA_INDEX_CHECK_INTERVAL and reloaded when its size or mtime changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.body: Optional[bytes] = None
+        self.gzipped: Optional[bytes] = None
+        self.etag = ""
+        self.stamp: Optional[Tuple[int, int]] = None
+        self.checked_at = 0.0
+        self.version = 0  # bumped on every (re)load
+
+    def current(self) -> Optional[bytes]:
+        now = datetime.now().timestamp()
+        if now - self.checked_at < SPA_INDEX_CHECK_INTERVAL:
+            return self.body
+        self.checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.body = self.gzipped = self.stamp = None
+            return None
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp != self.stamp:
+            with open(self.path, "rb") as f:
+                body = f.read()
+            self.body = body
+            self.gzipped = gzip.compress(body, 9)
+            self.etag = f'"index-{hashlib.sha1(body).hexdigest()[:16]}"'
+            self.stamp = stamp
+            self.version += 1
+        return self.body
+
+spa_index = SpaIndex(SPA_INDEX)
+
+def _spa_index_response(request: Request, missing: Response) -> Response:
+    body = spa_index.current()
+    if body is None:
+        return missing
+    _check_spa_assets()
+    # Revalidate every time so a new build is picked up immediately
+    headers = {"ETag": spa_index.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, spa_index.etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in _accepted_encodings(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=spa_index.gzipped, media_type="text/html", headers=headers)
+    return Response(content=body, media_type="text/html", headers=headers)
+
+# rel path -> {"path", "etag", "immutable", "gzip": path?, "br": path?}
+spa_assets: Dict[str, Dict[str, Any]] = {}
+spa_assets_version = 0  # spa_index.version the asset index was built for
+spa_assets_task: Optional[asyncio.Task] = None
+
+def _precompressed_variant(src: str, suffix: str, compress) -> Optional[str]:
+    """Path of src+suffix, (re)building it when missing or older than src."""
+    dest = src + suffix
+    try:
+        if os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(src):
+            return dest
+        with open(src, "rb") as f:
+            data = compress(f.read())
+        tmp = f"{dest}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+        return dest
+    except OSError as e:
+        print(f"Could not precompress {src}: {e}")
+        return None
+
+def _manifest_hashed_files() -> Optional[Set[str]]:
+    """Output files the build manifest lists (all content-hashed), relative to
+    SPA_DIR, or None when the build did not write a manifest."""
+    for path in SPA_MANIFESTS:
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        files: Set[str] = set()
+        for chunk in manifest.values():
+            files.add(chunk.get("file", ""))
+            files.update(chunk.get("css", []))
+            files.update(chunk.get("assets", []))
+        files.discard("")
+        return files
+    return None
+
+def _is_hashed_asset(rel_path: str, name: str, manifest: Optional[Set[str]]) -> bool:
+    if manifest is not None:
+        return rel_path in manifest or (name.endswith(".map") and rel_path[:-4] in manifest)
+    return bool(_HASHED_ASSET_RE.search(name))
+
+def _spa_asset_entry(path: str, manifest: Optional[Set[str]]) -> Dict[str, Any]:
+    name = os.path.basename(path)
+    stat = os.stat(path)
+    entry = {
+        "path": path,
+        "etag": f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+        "immutable": _is_hashed_asset(os.path.relpath(path, SPA_DIR).replace(os.sep, "/"), name, manifest),
+    }
+    if os.path.splitext(name)[1].lower() in SPA_COMPRESSIBLE and stat.st_size >= SPA_COMPRESS_MIN_BYTES:
+        entry["gzip"] = _precompressed_variant(path, ".gz", lambda data: gzip.compress(data, 9))
+        if brotli is not None:
+            entry["br"] = _precompressed_variant(path, ".br", lambda data: brotli.compress(data, quality=11))
+        elif os.path.exists(path + ".br"):
+            # Emitted by the build; serving needs no brotli module
+            entry["br"] = path + ".br"
+    return entry
+
+def build_spa_asset_index() -> Dict[str, Dict[str, Any]]:
+    index: Dict[str, Dict[str, Any]] = {}
+    if not os.path.isdir(SPA_ASSETS):
+        return index
+    manifest = _manifest_hashed_files()
+    for root, _, files in os.walk(SPA_ASSETS):
+        for name in files:
+            if name.endswith((".gz", ".br", ".tmp")):
+                continue
+            path = os.path.join(root, name)
+            index[os.path.relpath(path, SPA_ASSETS).replace(os.sep, "/")] = _spa_asset_entry(path, manifest)
+    return index
+
+def _find_spa_asset(rel_path: str) -> Optional[Dict[str, Any]]:
+    """Entry for a file under SPA_ASSETS that is not indexed yet, or None.
+    The resolved path must stay inside SPA_ASSETS."""
+    if rel_path.endswith((".gz", ".br", ".tmp")):
+        return None
+    root = os.path.realpath(SPA_ASSETS)
+    path = os.path.realpath(os.path.join(root, rel_path))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return _spa_asset_entry(path, _manifest_hashed_files())
+
+async def _rebuild_spa_assets(version: int):
+    global spa_assets, spa_assets_version
+    try:
+        spa_assets = await asyncio.to_thread(build_spa_asset_index)
+        spa_assets_version = version
+    except Exception as e:
+        print(f"SPA asset indexing failed: {e}")
+
+def _check_spa_assets():
+    """Rebuild the asset index in the background after index.html changed."""
+    global spa_assets_task
+    if spa_index.version != spa_assets_version and (spa_assets_task is None or spa_assets_task.done()):
+        spa_assets_task = asyncio.create_task(_rebuild_spa_assets(spa_index.version))
+
+@app.on_event("startup")
+async def load_spa_assets():
+    spa_index.current()
+    await _rebuild_spa_assets(spa_index.version)
+
+@app.api_route("/assets/{path:path}", methods=["GET", "HEAD"])
+async def serve_spa_asset(path: str, request: Request):
+    """Built SPA asset, precompressed when the client accepts it."""
+    entry = spa_assets.get(path)
+    if entry is None or not os.path.exists(entry["path"]):
+        # Bundles from a rebuild the index has not picked up yet
+        entry = await asyncio.to_thread(_find_spa_asset, path)
+        if entry is None:
+            spa_assets.pop(path, None)
+            raise HTTPException(status_code=404, detail="Not Found")
+        spa_assets[path] = entry
+    headers = {
+        "Cache-Control": SPA_IMMUTABLE_CACHE if entry["immutable"] else "no-cache",
+        "ETag": entry["etag"],
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    media_type = guess_type(path)[0] or "application/octet-stream"
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    for coding, key in (("br", "br"), ("gzip", "gzip")):
+        if coding in accepted and entry.get(key):
+            headers["Content-Encoding"] = coding
+            headers["ETag"] = f'{entry["etag"][:-1]}-{coding}"'
+            return FileResponse(entry[key], media_type=media_type, headers=headers)
+    return FileResponse(entry["path"], media_type=media_type, headers=headers)
+
+# Routes
+@app.get("/", response_class=HTMLResponse)
+async def read_root(request: Request):
+    # Serve ReactRecreation SPA
+    return _spa_index_response(request, HTMLResponse(
+        "<h3>React build not found. Please build the app in ReactRecreation/ReactRecreation.</h3>"))
+
+@app.get("/api/movies", response_model=Union[List[Movie], MoviePage])
+async def get_movies(request: Request, response: Response, category: Optional[str] = None,
+                     limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT), cursor: Optional[str] = None):
+    """List movies in id order. Passing limit or cursor returns one page
+    ({"items", "next_cursor"}) instead of the full list."""
+    etag, not_modified = _conditional(request, "movies", await run_storage(storage.movies_version))
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    if limit is None and cursor is None:
+        return await run_storage(storage.list_movies, category)
+    items, next_after = await run_storage(storage.page_movies, _decode_cursor("movies", cursor), _page_limit(limit), category)
+    return _page_response("movies", items, next_after)
+
+@app.get("/api/movies/{movie_id}", response_model=Movie)
+async def get_movie(movie_id: int):
+    movie = await run_storage(storage.get_movie, movie_id)
+    if movie is not None:
+        return movie
+    return {"error": "Movie not found"}
+
+@app.post("/api/movies", response_model=Movie)
+async def create_movie(movie: MovieCreate):
+    new_movie = await run_storage(storage.create_movie, movie.dict())
+    _index_movie(new_movie)
+    return new_movie
+
+@app.put("/api/movies/{movie_id}", response_model=Movie)
+async def update_movie(movie_id: int, movie: MovieCreate):
+    updated = await run_storage(storage.replace_movie, movie_id, movie.dict())
+    if updated is None:
+        return {"error": "Movie not found"}
+    _index_movie(updated)
+    return updated
+
+@app.delete("/api/movies/{movie_id}")
+async def delete_movie(movie_id: int):
+    deleted_movie = await run_storage(storage.delete_movie, movie_id)
+    if deleted_movie is None:
+        return {"error": "Movie not found"}
+    _unindex_movie(movie_id)
+    return {"message": f"Movie '{deleted_movie['title']}' deleted successfully"}
+
+@app.get("/api/categories")
+async def get_categories(request: Request, response: Response):
+    etag, not_modified = _conditional(request, "categories", await run_storage(storage.movies_version))
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    categories = await run_storage(storage.movie_categories)
+    return {"categories": categories}
+
+# ---------- Minimal endpoints expected by ReactRecreation ----------
+@app.get("/api/videos")
+async def api_videos_all(request: Request, limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+                         cursor: Optional[str] = None):
+    etag, not_modified = _conditional(request, "videos", frontend_videos.version)
+    if not_modified:
+        return not_modified
+    if limit is None and cursor is None:
+        return Response(content=frontend_videos.payload(), media_type="application/json", headers={"ETag": etag})
+    items, next_after = frontend_videos.page(_decode_cursor("videos", cursor), _page_limit(limit))
+    return JSONResponse(_page_response("videos", items, next_after), headers={"ETag": etag})
+
+@app.get("/api/videos/category")
+async def api_videos_by_category(request: Request, q: Optional[str] = None):
+    # React uses queryKey ['/api/videos/category', 'Audio'] - mimic by reading query param `q`
+    # If q not provided, return empty for safety
+    if not q:
+        return []
+    etag, not_modified = _conditional(request, "videos", frontend_videos.version)
+    if not_modified:
+        return not_modified
+    return Response(content=frontend_videos.payload(q), media_type="application/json", headers={"ETag": etag})
+
+@app.get("/api/videos/category/{category}")
+async def api_videos_by_category_path(request: Request, category: str,
+                                      limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+                                      cursor: Optional[str] = None):
+    etag, not_modified = _conditional(request, "videos", frontend_videos.version)
+    if not_modified:
+        return not_modified
+    if limit is None and cursor is None:
+        return Response(content=frontend_videos.payload(category or ''), media_type="application/json",
+                        headers={"ETag": etag})
+    kind = f"videos:{(category or '').lower()}"
+    items, next_after = frontend_videos.page(_decode_cursor(kind, cursor), _page_limit(limit), category or '')
+    return JSONResponse(_page_response(kind, items, next_after), headers={"ETag": etag})
+
+# ---------- Recreation content API (used by React Recreation page) ----------
+# Storage directory for recorded/uploaded short videos
+RECREATION_DIR = os.path.join("static", "recreation", "videos")
+os.makedirs(RECREATION_DIR, exist_ok=True)
+
+# Uploads are copied in fixed-size chunks and capped while they stream in
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+RECREATION_MAX_UPLOAD_BYTES = int(os.environ.get("RECREATION_MAX_UPLOAD_MB", "500")) * 1024 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+UPLOAD_BODY_OVERHEAD = 64 * 1024
+UPLOAD_PATHS = ("/api/recreation/upload", "/api/recreation/videos")
+
+class UploadSizeLimitMiddleware:
+    """Reject recreation upload bodies over the size cap as they arrive.
+
+    A declared Content-Length over the cap is refused before any body is
+    read; otherwise the body is counted chunk by chunk and the request is
+    aborted with 413 as soon as the running total crosses the cap.
+    """
+
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in UPLOAD_PATHS:
+            return await self.app(scope, receive, send)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body_bytes:
+                response = JSONResponse({"detail": "Upload too large"}, status_code=413)
+                return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware, max_body_bytes=RECREATION_MAX_UPLOAD_BYTES + UPLOAD_BODY_OVERHEAD)
+
+# Content-addressed storage: each unique payload is kept once under
+# BLOBS_DIR/<sha256[:2]>/<sha256>, and the files in RECREATION_DIR are hard
+# links to it. blob_refs maps visible filename -> {sha256, size, created_at}
+# and is persisted so deletes can be reference counted across restarts:
+# each change is appended to BLOB_REFS_LOG, which is folded into the
+# BLOB_REFS_PATH snapshot every BLOB_REFS_COMPACT_EVERY records and at startup.
+# All store/release work runs in a worker thread under blob_lock.
+BLOBS_DIR = os.path.join("data", "blobs")
+BLOB_REFS_PATH = os.path.join(BLOBS_DIR, "refs.json")
+BLOB_REFS_LOG = os.path.join(BLOBS_DIR, "refs.log")
+BLOB_REFS_COMPACT_EVERY = 1000
+
+blob_refs: Dict[str, Dict[str, Any]] = {}
+blob_refcounts: Dict[str, int] = {}
+blob_lock = threading.RLock()
+blob_log_records = 0
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+def _compact_blob_refs():
+    """Write blob_refs as the snapshot, then start an empty log. Replaying a
+    log over a snapshot that already includes it is harmless, so a crash
+    between the two steps loses nothing."""
+    global blob_log_records
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    tmp = f"{BLOB_REFS_PATH}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(blob_refs, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, BLOB_REFS_PATH)
+    open(BLOB_REFS_LOG, "w").close()
+    blob_log_records = 0
+
+def _log_blob_ref(name: str, ref: Optional[Dict[str, Any]]):
+    """Append one refs change (ref None = removed); caller holds blob_lock."""
+    global blob_log_records
+    with open(BLOB_REFS_LOG, "a") as f:
+        f.write(json.dumps({"name": name, "ref": ref}) + "\n")
+    blob_log_records += 1
+    if blob_log_records >= BLOB_REFS_COMPACT_EVERY:
+        _compact_blob_refs()
+
+def _load_blob_refs():
+    blob_refs.clear()
+    blob_refcounts.clear()
+    try:
+        with open(BLOB_REFS_PATH) as f:
+            blob_refs.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(BLOB_REFS_LOG) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if record.get("ref") is None:
+                    blob_refs.pop(record.get("name"), None)
+                else:
+                    blob_refs[record["name"]] = record["ref"]
+    except OSError:
+        pass
+    for name, ref in list(blob_refs.items()):
+        if not os.path.exists(os.path.join(RECREATION_DIR, name)):
+            # Visible file removed behind our back
+            del blob_refs[name]
+            continue
+        blob_refcounts[ref["sha256"]] = blob_refcounts.get(ref["sha256"], 0) + 1
+    _compact_blob_refs()
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _store_blob(tmp_path: str, digest: str, size: int, dest_path: str) -> bool:
+    """Move a fully written temp file into the blob store (or drop it if the
+    payload is already stored) and link dest_path to it. Returns True when
+    the payload was a duplicate. Blocking; see store_blob."""
+    with blob_lock:
+        return _store_blob_locked(tmp_path, digest, size, dest_path)
+
+def _store_blob_locked(tmp_path: str, digest: str, size: int, dest_path: str) -> bool:
+    blob = _blob_path(digest)
+    duplicate = os.path.exists(blob)
+    if duplicate:
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.replace(tmp_path, blob)
+    name = os.path.basename(dest_path)
+    recreation_index.refresh()
+    existing = blob_refs.get(name)
+    if existing is not None and existing["sha256"] == digest and os.path.exists(dest_path):
+        # Retry of the same upload within a second: dest already holds this payload
+        return True
+    # Take the new reference before releasing the old one, so replacing a
+    # file with a copy of the same payload can't drop the blob to zero refs
+    blob_refcounts[digest] = blob_refcounts.get(digest, 0) + 1
+    if os.path.exists(dest_path):
+        # Same timestamped name within a second: newest upload wins, as before
+        _release_blob_locked(name)
+    try:
+        os.link(blob, dest_path)
+    except OSError:
+        # Filesystem without hard links (or across devices): keep a plain copy
+        shutil.copyfile(blob, dest_path)
+    blob_refs[name] = {"sha256": digest, "size": size, "created_at": datetime.now().isoformat()}
+    _log_blob_ref(name, blob_refs[name])
+    recreation_index.add(_recreation_item(name, size, blob_refs[name]["created_at"]))
+    return duplicate
+
+async def store_blob(tmp_path: str, digest: str, size: int, dest_path: str) -> bool:
+    return await asyncio.to_thread(_store_blob, tmp_path, digest, size, dest_path)
+
+def _release_blob(name: str):
+    """Remove a visible recreation file and drop its blob once unreferenced.
+    Blocking; see release_blob."""
+    with blob_lock:
+        _release_blob_locked(name)
+
+def _release_blob_locked(name: str):
+    recreation_index.refresh()
+    os.remove(os.path.join(RECREATION_DIR, name))
+    recreation_index.remove(name)
+    ref = blob_refs.pop(name, None)
+    if ref is None:
+        return
+    digest = ref["sha256"]
+    blob_refcounts[digest] = blob_refcounts.get(digest, 1) - 1
+    if blob_refcounts[digest] <= 0:
+        del blob_refcounts[digest]
+        blob = _blob_path(digest)
+        try:
+            os.remove(blob)
+            os.rmdir(os.path.dirname(blob))  # only succeeds once the shard is empty
+        except OSError:
+            pass
+    _log_blob_ref(name, None)
+
+async def release_blob(name: str):
+    await asyncio.to_thread(_release_blob, name)
+
+@app.on_event("startup")
+async def load_blob_store():
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    await asyncio.to_thread(_load_blob_refs)
+    # Listing takes created_at from the refs; rebuild on next read
+    recreation_index.invalidate()
+
+async def _save_upload_stream(file: UploadFile, dest_path: str, max_bytes: int = RECREATION_MAX_UPLOAD_BYTES) -> int:
+    """Copy an upload to dest_path chunk by chunk and return its size.
+
+    Data is hashed as it streams into a temporary file in the blob store,
+    with every write done off the event loop; once complete it is stored
+    under its digest (or discarded if that payload already exists) and
+    dest_path is linked to it, so readers never see a partial file.
+    Exceeding max_bytes aborts with 413.
+    """
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    tmp_path = os.path.join(BLOBS_DIR, f"upload.part-{uuid.uuid4().hex[:8]}")
+    digest = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail="Upload too large")
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+        await asyncio.to_thread(out.flush)
+        await asyncio.to_thread(os.fsync, out.fileno())
+        out.close()
+        if await store_blob(tmp_path, digest.hexdigest(), size, dest_path):
+            print(f"Duplicate upload, linked to existing blob {digest.hexdigest()[:12]}")
+    except BaseException:
+        out.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+def _recreation_item(name: str, size: int, created_at: str) -> Dict[str, Any]:
+    return {
+        "id": name,
+        "title": os.path.splitext(name)[0],
+        "url": f"/static/recreation/videos/{name}",
+        "size_bytes": size,
+        "created_at": created_at,
+    }
+
+def _recreation_filename(original: Optional[str]) -> str:
+    """Timestamped, sanitized filename for a new recording."""
+    ext = os.path.splitext(original or "")[1] or ".webm"
+    if ext.lower() not in [".webm", ".mp4", ".mov", ".mkv"]:
+        ext = ".webm"
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_name = re.sub(r"[^a-zA-Z0-9_-]", "_", os.path.splitext(original or "recording")[0])
+    return f"{ts}_{safe_name}{ext}"
+
+def _enqueue_recreation_job(filename: str) -> Dict[str, Any]:
+    # Validation, duration and thumbnail happen in the background
+    return enqueue_job("recreation_upload", {
+        "path": os.path.join(RECREATION_DIR, filename),
+        "title": os.path.splitext(filename)[0],
+        "thumbnail": f"thumb_{os.path.splitext(filename)[0]}.png",
+    })
+
+RECREATION_EXTENSIONS = (".webm", ".mp4", ".mov", ".mkv")
+
+def _scan_recreation_dir() -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    if not os.path.isdir(RECREATION_DIR):
+        return items
+
+    with os.scandir(RECREATION_DIR) as it:
+        for entry in it:
+            name = entry.name
+            if not name.lower().endswith(RECREATION_EXTENSIONS) or not entry.is_file():
+                continue
+            ref = blob_refs.get(name)
+            if ref is not None:
+                # Links share one inode, so its ctime is not per-file
+                items.append(_recreation_item(name, ref["size"], ref["created_at"]))
+                continue
+            stat = entry.stat()
+            items.append(_recreation_item(name, stat.st_size,
+                                          datetime.fromtimestamp(max(stat.st_ctime, stat.st_mtime)).isoformat()))
+    # Newest first (id breaks ties so keyset paging is stable)
+    items.sort(key=lambda x: (x["created_at"], x["id"]), reverse=True)
+    return items
+
+def _desc_position(items: List[Dict[str, Any]], key: Tuple[str, str]) -> int:
+    """First index in a newest-first listing whose (created_at, id) sorts below key."""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (items[mid]["created_at"], items[mid]["id"]) < key:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+class RecreationIndex:
+    """Presorted newest-first listing of RECREATION_DIR.
+
+    Upload and delete paths update it in place; anything else touching the
+    directory changes its mtime, which triggers a full rescan on next read.
+    Those updates come from blob worker threads, so changes swap in a new
+    items list under self.lock and readers keep a consistent snapshot.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.items: List[Dict[str, Any]] = []
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.dir_mtime_ns: Optional[int] = None
+        self._payload: Optional[bytes] = None
+        self.version = 0
+
+    def _dir_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(RECREATION_DIR).st_mtime_ns
+        except OSError:
+            return None
 
-@app.put("/api/movies/{movie_id}", response_model=Movie)
-async def update_movie(movie_id: int, movie: MovieCreate):
-    for i, existing_movie in enumerate(movies_db):
-        if existing_movie["id"] == movie_id:
-            movies_db[i] = {"id": movie_id, **movie.dict()}
-            return movies_db[i]
-    return {"error": "Movie not found"}
+    def _changed(self):
+        self._payload = None
+        self.version += 1
 
-@app.delete("/api/movies/{movie_id}")
-async def delete_movie(movie_id: int):
-    for i, movie in enumerate(movies_db):
-        if movie["id"] == movie_id:
-            deleted_movie = movies_db.pop(i)
-            return {"message": f"Movie '{deleted_movie['title']}' deleted successfully"}
-    return {"error": "Movie not found"}
+    def refresh(self):
+        with self.lock:
+            mtime = self._dir_mtime()
+            if mtime is not None and mtime == self.dir_mtime_ns:
+                return
+            self.items = _scan_recreation_dir()
+            self.by_name = {item["id"]: item for item in self.items}
+            self.dir_mtime_ns = mtime
+            self._changed()
 
-@app.get("/api/categories")
-async def get_categories():
-    categories = list(set([movie["category"] for movie in movies_db]))
-    return {"categories": categories}
+    def invalidate(self):
+        self.dir_mtime_ns = None
 
-# ---------- Minimal endpoints expected by ReactRecreation ----------
-@app.get("/api/videos")
-async def api_videos_all():
-    return [v.dict() for v in frontend_videos]
+    def add(self, item: Dict[str, Any]):
+        """Record a file just written. Call refresh() before touching the
+        directory so the mtime taken here only covers our own change."""
+        with self.lock:
+            items = self._without(item["id"])
+            pos = _desc_position(items, (item["created_at"], item["id"]))
+            self.items = items[:pos] + [item] + items[pos:]
+            self.by_name[item["id"]] = item
+            self.dir_mtime_ns = self._dir_mtime()
+            self._changed()
 
-@app.get("/api/videos/category")
-async def api_videos_by_category(q: Optional[str] = None):
-    # React uses queryKey ['/api/videos/category', 'Audio'] - mimic by reading query param `q`
-    # If q not provided, return empty for safety
-    if not q:
-        return []
-    return [v.dict() for v in frontend_videos if (v.category or '').lower() == (q or '').lower()]
+    def remove(self, name: str):
+        with self.lock:
+            self.items = self._without(name)
+            self.dir_mtime_ns = self._dir_mtime()
+            self._changed()
 
-@app.get("/api/videos/category/{category}")
-async def api_videos_by_category_path(category: str):
-    cat = (category or '').lower()
-    return [v.dict() for v in frontend_videos if (v.category or '').lower() == cat]
+    def _without(self, name: str) -> List[Dict[str, Any]]:
+        item = self.by_name.pop(name, None)
+        if item is None:
+            return self.items
+        pos = _desc_position(self.items, (item["created_at"], item["id"])) - 1
+        if 0 <= pos < len(self.items) and self.items[pos] is item:
+            return self.items[:pos] + self.items[pos + 1:]
+        return [other for other in self.items if other is not item]
 
-# ---------- Recreation content API (used by React Recreation page) ----------
-# Storage directory for recorded/uploaded short videos
-RECREATION_DIR = os.path.join("static", "recreation", "videos")
-os.makedirs(RECREATION_DIR, exist_ok=True)
+    def list(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return self.items
+
+    def payload(self) -> bytes:
+        with self.lock:
+            self.refresh()
+            if self._payload is None:
+                self._payload = _encode_json(self.items)
+            return self._payload
+
+recreation_index = RecreationIndex()
 
 def _list_recreation_videos() -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    if not os.path.isdir(RECREATION_DIR):
-        return items
+    return recreation_index.list()
 
-    for name in os.listdir(RECREATION_DIR):
-        file_path = os.path.join(RECREATION_DIR, name)
-        if not os.path.isfile(file_path):
-            continue
-        if not any(name.lower().endswith(ext) for ext in [".webm", ".mp4", ".mov", ".mkv"]):
-            continue
-        stat = os.stat(file_path)
-        items.append({
-            "id": name,
-            "title": os.path.splitext(name)[0],
-            "url": f"/static/recreation/videos/{name}",
-            "size_bytes": stat.st_size,
-            "created_at": datetime.fromtimestamp(max(stat.st_ctime, stat.st_mtime)).isoformat(),
-        })
-    # Newest first
-    items.sort(key=lambda x: x["created_at"], reverse=True)
-    return items
+def _recreation_page(items: List[Dict[str, Any]], after: Optional[List[str]], limit: int):
+    """Page of the newest-first listing that comes after the (created_at, id) key."""
+    start = _desc_position(items, tuple(after)) if after is not None else 0
+    page = items[start:start + limit]
+    next_after = None
+    if page and start + limit < len(items):
+        next_after = [page[-1]["created_at"], page[-1]["id"]]
+    return page, next_after
 
 @app.get("/api/recreation/videos")
-async def api_recreation_list_videos():
-    """List uploaded/recorded recreation videos. Returns [] if none."""
-    return _list_recreation_videos()
+async def api_recreation_list_videos(limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+                                     cursor: Optional[str] = None):
+    """List uploaded/recorded recreation videos, newest first. Returns [] if none.
+    Passing limit or cursor returns one page ({"items", "next_cursor"})."""
+    if limit is None and cursor is None:
+        return Response(content=recreation_index.payload(), media_type="application/json")
+    items = _list_recreation_videos()
+    page, next_after = _recreation_page(items, _decode_cursor("recreation", cursor), _page_limit(limit))
+    return _page_response("recreation", page, next_after)
 
 @app.post("/api/recreation/upload")
 async def api_recreation_upload_video(file: UploadFile = File(...)):
@@ -617,32 +3616,21 @@ async def api_recreation_upload_video(file: UploadFile = File(...)):
         # Ensure directory exists
         os.makedirs(RECREATION_DIR, exist_ok=True)
         
-        ext = os.path.splitext(file.filename or "")[1] or ".webm"
-        if ext.lower() not in [".webm", ".mp4", ".mov", ".mkv"]:
-            ext = ".webm"
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = re.sub(r"[^a-zA-Z0-9_-]", "_", os.path.splitext(file.filename or "recording")[0])
-        filename = f"{ts}_{safe_name}{ext}"
+        filename = _recreation_filename(file.filename)
         dest_path = os.path.join(RECREATION_DIR, filename)
         
         print(f"Saving to: {dest_path}")
         
-        # Read file content and save
-        content = await file.read()
-        with open(dest_path, "wb") as out:
-            out.write(content)
-        
-        file_size = os.path.getsize(dest_path)
+        # Stream to disk in chunks (bounded memory, atomic rename)
+        file_size = await _save_upload_stream(file, dest_path)
         print(f"File saved successfully: {file_size} bytes")
-        
-        item = {
-            "id": filename,
-            "title": os.path.splitext(filename)[0],
-            "url": f"/static/recreation/videos/{filename}",
-            "size_bytes": file_size,
-            "created_at": datetime.now().isoformat(),
-        }
+
+        job = _enqueue_recreation_job(filename)
+        item = _recreation_item(filename, file_size, datetime.now().isoformat())
+        item["job_id"] = job["id"]
         return item
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
@@ -659,26 +3647,219 @@ async def api_recreation_delete_video(video_id: str):
         target = os.path.join(RECREATION_DIR, video_id)
         if not os.path.isfile(target):
             raise HTTPException(status_code=404, detail="Video not found")
-        os.remove(target)
+        await release_blob(video_id)
         return {"deleted": True, "id": video_id}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {e}")
 
+# ---------- Resumable recreation uploads ----------
+# create session -> PATCH chunks at Upload-Offset -> finalize. Each session is
+# a JSON metadata file plus a .part data file under UPLOAD_SESSIONS_DIR; the
+# part file's size is the committed offset, so sessions survive restarts.
+UPLOAD_SESSIONS_DIR = os.path.join("data", "uploads")
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24")) * 3600
+UPLOAD_SESSION_GC_INTERVAL = 600.0
+
+upload_sessions: Dict[str, Dict[str, Any]] = {}
+upload_session_locks: Dict[str, asyncio.Lock] = {}
+upload_gc_task: Optional[asyncio.Task] = None
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: Optional[int] = None
+
+def _session_paths(session_id: str) -> Tuple[str, str]:
+    base = os.path.join(UPLOAD_SESSIONS_DIR, session_id)
+    return f"{base}.json", f"{base}.part"
+
+def _save_session(session: Dict[str, Any]):
+    meta_path, _ = _session_paths(session["id"])
+    tmp = f"{meta_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp, meta_path)
+
+def _session_offset(session_id: str) -> int:
+    try:
+        return os.path.getsize(_session_paths(session_id)[1])
+    except OSError:
+        return 0
+
+def _drop_session(session_id: str):
+    upload_sessions.pop(session_id, None)
+    upload_session_locks.pop(session_id, None)
+    for path in _session_paths(session_id):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _load_upload_sessions():
+    if not os.path.isdir(UPLOAD_SESSIONS_DIR):
+        return
+    for name in os.listdir(UPLOAD_SESSIONS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(UPLOAD_SESSIONS_DIR, name)) as f:
+                session = json.load(f)
+            upload_sessions[session["id"]] = session
+        except Exception:
+            continue
+
+def _gc_upload_sessions() -> int:
+    """Delete sessions that have not received data within UPLOAD_SESSION_TTL."""
+    now = datetime.now().timestamp()
+    expired = [sid for sid, session in upload_sessions.items() if now - session["updated_at"] > UPLOAD_SESSION_TTL
+               and not upload_session_locks.get(sid, asyncio.Lock()).locked()]
+    for sid in expired:
+        _drop_session(sid)
+    return len(expired)
+
+async def _upload_gc_loop():
+    while True:
+        await asyncio.sleep(UPLOAD_SESSION_GC_INTERVAL)
+        try:
+            _gc_upload_sessions()
+        except Exception as e:
+            print(f"Upload session GC error: {e}")
+
+def _get_session(session_id: str) -> Dict[str, Any]:
+    session = upload_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+def _session_view(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": _session_offset(session["id"]),
+        "expires_at": datetime.fromtimestamp(session["updated_at"] + UPLOAD_SESSION_TTL).isoformat(),
+    }
+
+@app.on_event("startup")
+async def start_upload_sessions():
+    global upload_gc_task
+    os.makedirs(UPLOAD_SESSIONS_DIR, exist_ok=True)
+    _load_upload_sessions()
+    _gc_upload_sessions()
+    upload_gc_task = asyncio.create_task(_upload_gc_loop())
+
+@app.on_event("shutdown")
+async def stop_upload_sessions():
+    if upload_gc_task is not None:
+        upload_gc_task.cancel()
+
+@app.post("/api/recreation/uploads", status_code=201)
+async def create_upload_session(body: UploadSessionCreate, response: Response):
+    """Start a resumable upload. size (bytes) is optional but lets finalize verify completeness."""
+    if body.size is not None and (body.size < 0 or body.size > RECREATION_MAX_UPLOAD_BYTES):
+        raise HTTPException(status_code=413, detail="Upload too large")
+    os.makedirs(UPLOAD_SESSIONS_DIR, exist_ok=True)
+    session = {
+        "id": uuid.uuid4().hex,
+        "filename": body.filename,
+        "size": body.size,
+        "created_at": datetime.now().timestamp(),
+        "updated_at": datetime.now().timestamp(),
+    }
+    open(_session_paths(session["id"])[1], "wb").close()
+    _save_session(session)
+    upload_sessions[session["id"]] = session
+    response.headers["Location"] = f"/api/recreation/uploads/{session['id']}"
+    return _session_view(session)
+
+@app.get("/api/recreation/uploads/{session_id}")
+async def get_upload_session(session_id: str, response: Response):
+    """Current offset of a resumable upload (also sent as Upload-Offset)."""
+    view = _session_view(_get_session(session_id))
+    response.headers["Upload-Offset"] = str(view["offset"])
+    return view
+
+@app.patch("/api/recreation/uploads/{session_id}")
+async def patch_upload_session(session_id: str, request: Request):
+    """Append the request body at Upload-Offset. A mismatched offset gets 409
+    with the server's offset so the client can resume from there."""
+    session = _get_session(session_id)
+    try:
+        client_offset = int(request.headers.get("upload-offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Upload-Offset header required")
+    lock = upload_session_locks.setdefault(session_id, asyncio.Lock())
+    async with lock:
+        _get_session(session_id)  # aborted or finalized while we waited
+        offset = _session_offset(session_id)
+        if client_offset != offset:
+            return JSONResponse({"detail": "Offset mismatch", "offset": offset}, status_code=409,
+                                headers={"Upload-Offset": str(offset)})
+        limit = session["size"] if session["size"] is not None else RECREATION_MAX_UPLOAD_BYTES
+        part_path = _session_paths(session_id)[1]
+        out = await asyncio.to_thread(open, part_path, "ab")
+        try:
+            # Whatever reaches disk before a dropped connection stays committed
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if offset + len(chunk) > limit:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds declared upload size")
+                await asyncio.to_thread(out.write, chunk)
+                offset += len(chunk)
+            await asyncio.to_thread(out.flush)
+            await asyncio.to_thread(os.fsync, out.fileno())
+        finally:
+            out.close()
+            if upload_sessions.get(session_id) is session:
+                session["updated_at"] = datetime.now().timestamp()
+                _save_session(session)
+    return JSONResponse({"id": session_id, "offset": offset}, headers={"Upload-Offset": str(offset)})
+
+@app.post("/api/recreation/uploads/{session_id}/finalize")
+async def finalize_upload_session(session_id: str):
+    """Move a completed upload into the recreation library; returns the same
+    item shape as the listing (plus job_id)."""
+    session = _get_session(session_id)
+    lock = upload_session_locks.setdefault(session_id, asyncio.Lock())
+    async with lock:
+        _get_session(session_id)
+        offset = _session_offset(session_id)
+        if session["size"] is not None and offset != session["size"]:
+            raise HTTPException(status_code=409, detail=f"Upload incomplete: {offset}/{session['size']} bytes")
+        if offset == 0:
+            raise HTTPException(status_code=400, detail="Upload is empty")
+        os.makedirs(RECREATION_DIR, exist_ok=True)
+        filename = _recreation_filename(session["filename"])
+        part_path = _session_paths(session_id)[1]
+        digest = await asyncio.to_thread(_hash_file, part_path)
+        await store_blob(part_path, digest, offset, os.path.join(RECREATION_DIR, filename))
+        _drop_session(session_id)
+    job = _enqueue_recreation_job(filename)
+    item = _recreation_item(filename, offset, datetime.now().isoformat())
+    item["job_id"] = job["id"]
+    return item
+
+@app.delete("/api/recreation/uploads/{session_id}")
+async def abort_upload_session(session_id: str):
+    _get_session(session_id)
+    # Wait for an in-flight PATCH/finalize so its files are not removed under it
+    async with upload_session_locks.setdefault(session_id, asyncio.Lock()):
+        _get_session(session_id)
+        _drop_session(session_id)
+    return {"deleted": True, "id": session_id}
+
 # Recreation endpoints
 @app.get("/recreation", response_class=HTMLResponse)
 async def recreation_page(request: Request):
-    if os.path.exists(SPA_INDEX):
-        return FileResponse(SPA_INDEX)
-    return HTMLResponse("<h3>React build not found. Please build the app in ReactRecreation/ReactRecreation.</h3>")
+    return _spa_index_response(request, HTMLResponse(
+        "<h3>React build not found. Please build the app in ReactRecreation/ReactRecreation.</h3>"))
 
 
 @app.get("/api/recreation/videos", response_model=List[RecreationVideo])
 async def get_recreation_videos(category: Optional[str] = None):
-    if category:
-        return [video for video in recreation_videos_db if video["category"] == category]
-    return recreation_videos_db
+    return await run_storage(storage.list_recreation_records, category)
 
 @app.post("/api/recreation/upload")
 async def upload_recreation_video(
@@ -694,128 +3875,709 @@ async def upload_recreation_video(
         file_path = f"static/recreation/videos/{filename}"
         
         # Save video file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Generate thumbnail (placeholder for now)
-        thumbnail_filename = f"thumb_{timestamp}.jpg"
-        thumbnail_path = f"static/recreation/thumbnails/{thumbnail_filename}"
-        
-        # Create a simple placeholder thumbnail
-        with open(thumbnail_path, "wb") as f:
-            f.write(b"")  # Placeholder - in real app, generate actual thumbnail
+        await _save_upload_stream(file, file_path)
         
+        # Thumbnail and duration are filled in by a background job
+        thumbnail_filename = f"thumb_{timestamp}.png"
+
         # Create video record
-        new_id = max([v["id"] for v in recreation_videos_db], default=0) + 1
-        video_record = {
-            "id": new_id,
+        video_record = await run_storage(storage.add_recreation_record, {
             "title": title,
             "description": description,
             "category": category,
-            "duration": "0:00",  # Will be updated when video is processed
+            "duration": "0:00",  # Updated by the recreation_upload job
             "thumbnail": thumbnail_filename,
             "video_file": filename,
             "created_at": datetime.now().isoformat(),
             "user_id": "user_123"  # In real app, get from session/auth
-        }
-        
-        recreation_videos_db.append(video_record)
+        })
+        job = enqueue_job("recreation_upload", {
+            "path": file_path,
+            "title": title,
+            "thumbnail": thumbnail_filename,
+            "record_id": video_record["id"],
+        })
         
         return {
             "message": "Video uploaded successfully",
-            "video": video_record
+            "video": video_record,
+            "job_id": job["id"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.delete("/api/recreation/videos/{video_id}")
 async def delete_recreation_video(video_id: int):
-    for i, video in enumerate(recreation_videos_db):
-        if video["id"] == video_id:
-            deleted_video = recreation_videos_db.pop(i)
-            
-            # Delete files
-            try:
-                os.remove(f"static/recreation/videos/{deleted_video['video_file']}")
-                os.remove(f"static/recreation/thumbnails/{deleted_video['thumbnail']}")
-            except:
-                pass  # Files might not exist
-            
-            return {"message": f"Video '{deleted_video['title']}' deleted successfully"}
-    return {"error": "Video not found"}
+    deleted_video = await run_storage(storage.delete_recreation_record, video_id)
+    if deleted_video is None:
+        return {"error": "Video not found"}
+
+    # Delete files
+    try:
+        os.remove(f"static/recreation/videos/{deleted_video['video_file']}")
+        os.remove(f"static/recreation/thumbnails/{deleted_video['thumbnail']}")
+    except:
+        pass  # Files might not exist
+
+    return {"message": f"Video '{deleted_video['title']}' deleted successfully"}
+
+# ---------- Background media jobs (upload post-processing) ----------
+JOBS_DIR = os.path.join("data", "jobs")
+RECREATION_THUMBS_DIR = os.path.join("static", "recreation", "thumbnails")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 2.0  # seconds, doubled on each retry
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", str(24 * 3600)))
+JOB_HISTORY_MAX = int(os.environ.get("JOB_HISTORY_MAX", "1000"))
+THUMBNAIL_SIZE = (320, 180)
+FFMPEG_TIMEOUT = 30.0
+
+# job id -> job record; every state change is also written to JOBS_DIR
+jobs_db: Dict[str, Dict[str, Any]] = {}
+job_queue: Optional[asyncio.Queue] = None
+# finished (succeeded/failed) job id -> finish time, oldest first; pruned by age and count
+finished_jobs: "OrderedDict[str, float]" = OrderedDict()
+job_worker_tasks: List[asyncio.Task] = []
+
+class JobPermanentError(Exception):
+    """A job failure that retrying cannot fix (e.g. an unreadable upload)."""
+
+def _save_job(job: Dict[str, Any]):
+    job["updated_at"] = datetime.now().isoformat()
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    path = os.path.join(JOBS_DIR, f"{job['id']}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp, path)
+
+def _load_jobs():
+    """Reload persisted jobs; anything not finished is queued again."""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    for name in os.listdir(JOBS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOBS_DIR, name)) as f:
+                job = json.load(f)
+        except Exception:
+            continue
+        if job.get("status") in ("running", "retrying"):
+            job["status"] = "queued"
+        jobs_db[job["id"]] = job
+    done = [j for j in jobs_db.values() if j.get("status") in ("succeeded", "failed")]
+    for job in sorted(done, key=lambda j: j.get("updated_at") or ""):
+        try:
+            finished_at = datetime.fromisoformat(job["updated_at"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            finished_at = 0.0
+        finished_jobs[job["id"]] = finished_at
+    _prune_jobs()
+
+def _prune_jobs():
+    """Forget finished jobs past JOB_RETENTION_SECONDS or beyond JOB_HISTORY_MAX."""
+    cutoff = datetime.now().timestamp() - JOB_RETENTION_SECONDS
+    while finished_jobs:
+        job_id, finished_at = next(iter(finished_jobs.items()))
+        if finished_at >= cutoff and len(finished_jobs) <= JOB_HISTORY_MAX:
+            break
+        finished_jobs.popitem(last=False)
+        jobs_db.pop(job_id, None)
+        try:
+            os.remove(os.path.join(JOBS_DIR, f"{job_id}.json"))
+        except FileNotFoundError:
+            pass
+
+def enqueue_job(job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.now().isoformat()
+    job = {
+        "id": f"job_{uuid.uuid4().hex[:16]}",
+        "type": job_type,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": JOB_MAX_ATTEMPTS,
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    jobs_db[job["id"]] = job
+    _save_job(job)
+    if job_queue is not None:
+        job_queue.put_nowait(job["id"])
+    return job
+
+async def _run_job(job_id: str):
+    job = jobs_db.get(job_id)
+    if job is None or job["status"] in ("succeeded", "failed"):
+        return
+    handler = job_handlers.get(job["type"])
+    job["status"] = "running"
+    job["attempts"] += 1
+    _save_job(job)
+    try:
+        if handler is None:
+            raise JobPermanentError(f"no handler for job type {job['type']}")
+        job["result"] = await handler(job["payload"])
+        job["status"] = "succeeded"
+        job["error"] = None
+    except JobPermanentError as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    except Exception as e:
+        job["error"] = str(e)
+        if job["attempts"] < job["max_attempts"]:
+            job["status"] = "retrying"
+            delay = JOB_RETRY_DELAY * (2 ** (job["attempts"] - 1))
+            asyncio.get_running_loop().call_later(delay, job_queue.put_nowait, job_id)
+        else:
+            job["status"] = "failed"
+    _save_job(job)
+    if job["status"] in ("succeeded", "failed"):
+        finished_jobs[job_id] = datetime.now().timestamp()
+        _prune_jobs()
+
+async def _job_worker():
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await _run_job(job_id)
+        except Exception as e:
+            print(f"Job worker error ({job_id}): {e}")
+        finally:
+            job_queue.task_done()
+
+# Thumbnail generators: name -> fn(video_path, thumb_path, info) writing a PNG.
+# They run in a worker thread; add an entry here to plug in another renderer.
+# Only "ffmpeg" shows an actual frame of the video. "pillow" and "placeholder"
+# draw a title card / gradient instead and are used when ffmpeg is not installed
+# or cannot decode the upload (e.g. audio-only recordings).
+def _thumbnail_colors(title: str) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+    seed = zlib.crc32(title.encode("utf-8"))
+    top = (40 + seed % 120, 40 + (seed >> 8) % 120, 80 + (seed >> 16) % 120)
+    return top, (top[0] // 4, top[1] // 4, top[2] // 4)
+
+def _thumbnail_placeholder(video_path: str, thumb_path: str, info: Dict[str, Any]):
+    """Dependency-free poster: a vertical gradient PNG written with zlib."""
+    width, height = THUMBNAIL_SIZE
+    top, bottom = _thumbnail_colors(info.get("title") or os.path.basename(video_path))
+    rows = []
+    for y in range(height):
+        t = y / max(1, height - 1)
+        pixel = bytes(int(top[i] + (bottom[i] - top[i]) * t) for i in range(3))
+        rows.append(b"\x00" + pixel * width)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    png = (b"\x89PNG\r\n\x1a\n"
+           + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+           + chunk(b"IEND", b""))
+    with open(thumb_path, "wb") as f:
+        f.write(png)
+
+def _thumbnail_pillow(video_path: str, thumb_path: str, info: Dict[str, Any]):
+    """Poster card with the title and duration drawn by Pillow."""
+    from PIL import Image, ImageDraw
+    width, height = THUMBNAIL_SIZE
+    title = info.get("title") or os.path.splitext(os.path.basename(video_path))[0]
+    top, bottom = _thumbnail_colors(title)
+    img = Image.new("RGB", THUMBNAIL_SIZE, top)
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        t = y / max(1, height - 1)
+        draw.line([(0, y), (width, y)], fill=tuple(int(top[i] + (bottom[i] - top[i]) * t) for i in range(3)))
+    draw.text((12, height - 40), title[:40], fill=(255, 255, 255))
+    if info.get("duration"):
+        draw.text((width - 60, 12), info["duration"], fill=(255, 255, 255))
+    img.save(thumb_path, "PNG")
+
+def _thumbnail_ffmpeg(video_path: str, thumb_path: str, info: Dict[str, Any]):
+    """A frame from about one second in, letterboxed to THUMBNAIL_SIZE by ffmpeg."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ImportError("ffmpeg is not installed")
+    width, height = THUMBNAIL_SIZE
+    seconds = info.get("seconds") or 0
+    offset = min(1.0, seconds / 2) if seconds > 0 else 0.0
+    scale = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+             f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2")
+    subprocess.run(
+        [ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-ss", f"{offset:.2f}", "-i", video_path,
+         "-frames:v", "1", "-vf", scale, "-f", "image2", "-c:v", "png", thumb_path],
+        check=True, timeout=FFMPEG_TIMEOUT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    if not os.path.isfile(thumb_path) or os.path.getsize(thumb_path) == 0:
+        raise OSError("ffmpeg produced no frame")
+
+thumbnail_generators = {
+    "ffmpeg": _thumbnail_ffmpeg,
+    "pillow": _thumbnail_pillow,
+    "placeholder": _thumbnail_placeholder,
+}
+
+def _default_thumbnail_generator() -> str:
+    if shutil.which("ffmpeg"):
+        return "ffmpeg"
+    try:
+        import PIL  # noqa: F401
+        return "pillow"
+    except ImportError:
+        return "placeholder"
+
+THUMBNAIL_GENERATOR = os.environ.get("THUMBNAIL_GENERATOR") or _default_thumbnail_generator()
+
+def generate_thumbnail(video_path: str, thumb_path: str, info: Dict[str, Any]):
+    """Try the configured generator, then each later one in thumbnail_generators."""
+    names = list(thumbnail_generators)
+    start = names.index(THUMBNAIL_GENERATOR) if THUMBNAIL_GENERATOR in names else len(names) - 1
+    for name in names[start:-1]:
+        try:
+            thumbnail_generators[name](video_path, thumb_path, info)
+            return
+        except (ImportError, OSError, subprocess.SubprocessError) as e:
+            print(f"Thumbnail generator {name} failed for {video_path}: {e}")
+    thumbnail_generators[names[-1]](video_path, thumb_path, info)
+
+def _sniff_media_format(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return _media_format(f.read(12))
+
+async def _process_recreation_upload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate an uploaded recording, read its duration and render a thumbnail."""
+    path = payload["path"]
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        raise JobPermanentError("uploaded file is missing or empty")
+    loop = asyncio.get_running_loop()
+    media_format = await loop.run_in_executor(None, _sniff_media_format, path)
+    if media_format is None:
+        raise JobPermanentError("not a recognized media container")
+    seconds = await probe_media_cached(path)
+    duration = _format_duration(seconds) or "0:00"
+    thumb_name = payload["thumbnail"]
+    os.makedirs(RECREATION_THUMBS_DIR, exist_ok=True)
+    await loop.run_in_executor(None, generate_thumbnail, path, os.path.join(RECREATION_THUMBS_DIR, thumb_name),
+                               {"title": payload.get("title"), "duration": duration, "seconds": seconds})
+    record_id = payload.get("record_id")
+    if record_id is not None:
+        await run_storage(storage.update_recreation_record, record_id, {"duration": duration, "thumbnail": thumb_name})
+    return {
+        "format": media_format,
+        "duration": duration,
+        "duration_seconds": seconds,
+        "thumbnail": thumb_name,
+        "thumbnail_url": f"/static/recreation/thumbnails/{thumb_name}",
+    }
+
+job_handlers = {
+    "recreation_upload": _process_recreation_upload,
+}
+
+@app.on_event("startup")
+async def start_job_workers():
+    global job_queue
+    job_queue = asyncio.Queue()
+    _load_jobs()
+    for job in sorted(jobs_db.values(), key=lambda j: j["created_at"]):
+        if job["status"] == "queued":
+            job_queue.put_nowait(job["id"])
+    for _ in range(max(1, JOB_WORKERS)):
+        job_worker_tasks.append(asyncio.create_task(_job_worker()))
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    for task in job_worker_tasks:
+        task.cancel()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job (queued, running, retrying, succeeded, failed)."""
+    job = jobs_db.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # ==================== COIN SYSTEM FUNCTIONS ====================
 
 def get_user(user_id: str):
     """Get user by ID"""
-    for user in users_db:
-        if user["id"] == user_id:
-            return user
-    return None
+    return storage.get_user(user_id)
 
-def add_coins(user_id: str, amount: int, source: str, source_id: str = None, description: str = ""):
-    """Add coins to user account and create transaction record"""
-    user = get_user(user_id)
-    if not user:
-        return False
-    
-    # Add coins
-    user["coins"] += amount
-    
-    # Add experience (1 XP per coin)
-    user["experience"] += amount
-    
-    # Check for level up (every 20 XP = 1 level)
-    new_level = (user["experience"] // 20) + 1
-    if new_level > user["level"]:
-        user["level"] = new_level
-        # Bonus coins for leveling up
-        bonus_coins = new_level * 2
-        user["coins"] += bonus_coins
-        amount += bonus_coins
-    
-    # Update last activity
-    user["last_activity"] = datetime.now().isoformat()
-    
-    # Create transaction record
-    transaction = {
-        "id": f"txn_{len(coin_transactions_db) + 1}",
+# Coin operations run under a per-user lock (striped, so the lock table stays
+# fixed-size) and commit with compare-and-set on the user's version, retrying
+# when another process changed the user in between. Handlers call them through
+# run_storage, so with a blocking backend the lock wait and the retries happen
+# in a worker thread rather than on the event loop.
+COIN_LOCK_STRIPES = 64
+COIN_CAS_RETRIES = 20
+_coin_locks = [threading.Lock() for _ in range(COIN_LOCK_STRIPES)]
+
+def _coin_lock(user_id: str) -> threading.Lock:
+    return _coin_locks[zlib.crc32(user_id.encode("utf-8")) % COIN_LOCK_STRIPES]
+
+def apply_coin_operation(user_id: str, operation) -> Optional[dict]:
+    """Run operation(user) -> (transactions, reward_ids), or None to decline,
+    against a fresh copy of the user and commit the result atomically.
+    Returns commit_coin_change's result, or None if the user is missing or
+    the operation declined."""
+    with _coin_lock(user_id):
+        for _ in range(COIN_CAS_RETRIES):
+            current = storage.get_user_for_update(user_id)
+            if current is None:
+                return None
+            user, version = current
+            change = operation(user)
+            if change is None:
+                return None
+            result = storage.commit_coin_change(user, version, *change)
+            if result is not None:
+                return result
+    raise HTTPException(status_code=503, detail="Coin balance is busy, please retry")
+
+def _transaction(user_id: str, amount: int, kind: str, source: str, source_id: Optional[str], description: str) -> dict:
+    return {
         "user_id": user_id,
         "amount": amount,
-        "transaction_type": "earn",
+        "transaction_type": kind,
         "source": source,
         "source_id": source_id,
         "description": description,
         "timestamp": datetime.now().isoformat()
     }
-    coin_transactions_db.append(transaction)
-    
-    return True
 
-def spend_coins(user_id: str, amount: int, source: str, source_id: str = None, description: str = ""):
-    """Spend coins from user account and create transaction record"""
-    user = get_user(user_id)
-    if not user or user["coins"] < amount:
-        return False
+def _level_up(user: dict) -> int:
+    """Apply level-ups earned by the user's experience; returns the bonus coins."""
+    # Check for level up (every 20 XP = 1 level)
+    new_level = (user["experience"] // 20) + 1
+    if new_level <= user["level"]:
+        return 0
+    # Bonus coins for leveling up, once per level gained
+    bonus_coins = sum(level * 2 for level in range(user["level"] + 1, new_level + 1))
+    user["level"] = new_level
+    user["coins"] += bonus_coins
+    return bonus_coins
+
+def _earn(user: dict, amount: int) -> int:
+    """Credit coins and experience; returns the amount including any level-up bonus."""
+    # Add coins
+    user["coins"] += amount
     
-    # Deduct coins
-    user["coins"] -= amount
+    # Add experience (1 XP per coin)
+    user["experience"] += amount
     
-    # Create transaction record
-    transaction = {
-        "id": f"txn_{len(coin_transactions_db) + 1}",
-        "user_id": user_id,
-        "amount": -amount,
-        "transaction_type": "spend",
-        "source": source,
-        "source_id": source_id,
-        "description": description,
-        "timestamp": datetime.now().isoformat()
-    }
-    coin_transactions_db.append(transaction)
+    amount += _level_up(user)
     
-    return True
+    # Update last activity
+    user["last_activity"] = datetime.now().isoformat()
+    return amount
+
+def add_coins(user_id: str, amount: int, source: str, source_id: str = None, description: str = ""):
+    """Add coins to user account and create transaction record.
+    Returns the updated user, or None if there is no such user."""
+    def operation(user):
+        credited = _earn(user, amount)
+        return [_transaction(user_id, credited, "earn", source, source_id, description)], []
+
+    result = apply_coin_operation(user_id, operation)
+    return result["user"] if result else None
+
+def spend_coins(user_id: str, amount: int, source: str, source_id: str = None, description: str = "",
+                reward_id: Optional[str] = None):
+    """Spend coins from user account and create transaction record; with
+    reward_id the redemption is recorded in the same atomic change.
+    Returns the updated user, or None if missing or short of coins."""
+    def operation(user):
+        # Checked against the copy being committed, so two spends cannot both pass
+        if user["coins"] < amount:
+            return None
+        user["coins"] -= amount
+        return ([_transaction(user_id, -amount, "spend", source, source_id, description)],
+                [reward_id] if reward_id else [])
+
+    result = apply_coin_operation(user_id, operation)
+    return result["user"] if result else None
+
+# ==================== COIN LEDGER ====================
+# Coin state changes are appended to a JSON-lines log under LEDGER_DIR and
+# fsynced in groups: the writer waits LEDGER_COMMIT_WINDOW for more records,
+# then writes them all with one fsync, and handlers await coin_ledger.sync()
+# before answering. Durable transactions and redeemed rewards are then
+# copied to the per-user history files (UserHistory). Every
+# LEDGER_SNAPSHOT_EVERY records (and at shutdown) a snapshot of users and
+# counters is written and the log moves to a new segment; older segments go
+# to archive/ (the newest LEDGER_ARCHIVE_KEEP are kept) and are never
+# replayed, so startup cost follows the number of users, not of transactions.
+LEDGER_DIR = os.path.join("data", "ledger")
+LEDGER_COMMIT_WINDOW = float(os.environ.get("LEDGER_COMMIT_WINDOW_MS", "5")) / 1000
+LEDGER_SNAPSHOT_EVERY = int(os.environ.get("LEDGER_SNAPSHOT_EVERY", "5000"))
+LEDGER_ARCHIVE_KEEP = int(os.environ.get("LEDGER_ARCHIVE_KEEP", "20"))
+# Pause before retrying a failed log write
+LEDGER_RETRY_DELAY = 1.0
+
+class CoinLedger:
+    def __init__(self, directory: str, histories: List[UserHistory]):
+        self.directory = directory
+        self.histories = histories
+        # Records up to this seq are in the history files
+        self.history_seq = 0
+        self.archive_dir = os.path.join(directory, "archive")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.seq = 0
+        self.durable_seq = 0
+        self.pending: List[str] = []
+        self.since_snapshot = 0
+        self.segment = None
+        self.segment_path: Optional[str] = None
+        self.waiters: List[Tuple[int, asyncio.Future]] = []
+        self.wake: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.commits = 0
+        # A failed write may have left a partial line at the end of the segment
+        self.torn = False
+
+    def append(self, op: str, **data) -> int:
+        """Queue a record; it is durable once sync() covering its seq returns."""
+        self.seq += 1
+        self.pending.append(json.dumps({"seq": self.seq, "op": op, **data}, separators=(",", ":")) + "\n")
+        self.since_snapshot += 1
+        if self.wake is not None:
+            self.wake.set()
+        return self.seq
+
+    async def sync(self, seq: Optional[int] = None):
+        """Wait until every record up to seq (default: all so far) is on disk."""
+        target = self.seq if seq is None else seq
+        if self.task is None or self.durable_seq >= target:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((target, future))
+        await future
+
+    def _open_segment(self, first_seq: int):
+        os.makedirs(self.directory, exist_ok=True)
+        self.segment_path = os.path.join(self.directory, f"ledger-{first_seq:012d}.log")
+        self.segment = open(self.segment_path, "a", encoding="utf-8")
+
+    def _segments(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, n) for n in os.listdir(self.directory)
+                      if n.startswith("ledger-") and n.endswith(".log"))
+
+    def _write(self, lines: List[str]):
+        # Start on a fresh line after a failed write so its fragment stays on its own
+        data = ("\n" if self.torn else "") + "".join(lines)
+        self.torn = True
+        self.segment.write(data)
+        self.segment.flush()
+        os.fsync(self.segment.fileno())
+        self.torn = False
+
+    async def _flush(self) -> bool:
+        """Write pending records; False if the write failed (they stay pending)."""
+        if not self.pending:
+            return True
+        lines, upto = self.pending, self.seq
+        self.pending = []
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except Exception as e:
+            print(f"Ledger write failed: {e}")
+            # The in-memory state already includes these records; keep them for the retry
+            self.pending = lines + self.pending
+            for target, future in self.waiters:
+                if target <= upto and not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail="Ledger unavailable"))
+            self.waiters = [(t, f) for t, f in self.waiters if not f.done()]
+            return False
+        self.commits += 1
+        self.durable_seq = upto
+        remaining = []
+        for target, future in self.waiters:
+            if target <= upto:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                remaining.append((target, future))
+        self.waiters = remaining
+        return True
+
+    def _history_batches(self, upto: int) -> List[Tuple[UserHistory, List[Tuple[str, dict]]]]:
+        return [(history, [(user_id, record) for user_id, pending in history.tail.items()
+                           for seq, record in pending if seq <= upto])
+                for history in self.histories]
+
+    @staticmethod
+    def _append_history(batches: List[Tuple[UserHistory, List[Tuple[str, dict]]]]):
+        for history, entries in batches:
+            if entries:
+                history.write(entries)
+
+    async def _flush_history(self) -> bool:
+        """Copy durable records into the history files; False if that failed
+        (they stay in the tails and are retried)."""
+        upto = self.durable_seq
+        if upto <= self.history_seq:
+            return True
+        try:
+            await asyncio.to_thread(self._append_history, self._history_batches(upto))
+        except Exception as e:
+            print(f"Ledger history write failed: {e}")
+            return False
+        for history in self.histories:
+            history.written(upto)
+        self.history_seq = upto
+        return True
+
+    async def snapshot(self):
+        # Copy now: records appended while the flush below runs must not leak
+        # into a snapshot stamped with this seq. Encoding happens off the loop.
+        seq = self.seq
+        state = _ledger_state()
+        if not await self._flush() or not await self._flush_history():
+            raise OSError("ledger flush failed; snapshot skipped")
+
+        def write_snapshot():
+            body = json.dumps({**state, "seq": seq}, separators=(",", ":"))
+            # Archived segments are never replayed, so history must be on disk first
+            for history in self.histories:
+                history.sync()
+            tmp = f"{self.snapshot_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            # Segments fully covered by the snapshot leave the replay path
+            old = self.segment
+            self._open_segment(seq + 1)
+            old.close()
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for path in self._segments():
+                if path != self.segment_path:
+                    os.replace(path, os.path.join(self.archive_dir, os.path.basename(path)))
+            archived = sorted(n for n in os.listdir(self.archive_dir) if n.startswith("ledger-") and n.endswith(".log"))
+            for name in archived[:max(0, len(archived) - LEDGER_ARCHIVE_KEEP)]:
+                os.remove(os.path.join(self.archive_dir, name))
+
+        await asyncio.to_thread(write_snapshot)
+        self.since_snapshot = len(self.pending)
+
+    def load(self):
+        """Restore coin state from the snapshot and replay the log tail."""
+        snapshot_seq = 0
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                state = json.load(f)
+            snapshot_seq = state["seq"]
+            _ledger_restore(state)
+        except FileNotFoundError:
+            pass
+        self.seq = snapshot_seq
+        replayed = 0
+        for path in self._segments():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash or a failed write; the retry (if any) follows
+                        continue
+                    if record["seq"] <= self.seq:
+                        # Covered by the snapshot, or rewritten by a retry after a partial write
+                        continue
+                    _ledger_apply(record)
+                    self.seq = record["seq"]
+                    replayed += 1
+        self.durable_seq = self.seq
+        # Replayed records the history files may not have yet (write skips the rest)
+        self._append_history(self._history_batches(self.seq))
+        for history in self.histories:
+            history.written(self.seq)
+        self.history_seq = self.seq
+        self.since_snapshot = replayed
+        self._open_segment(self.seq + 1)
+        print(f"Coin ledger: snapshot seq {snapshot_seq}, replayed {replayed} records")
+
+    async def run(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            # Let concurrent requests join this commit
+            await asyncio.sleep(LEDGER_COMMIT_WINDOW)
+            try:
+                if not await self._flush() or not await self._flush_history():
+                    await asyncio.sleep(LEDGER_RETRY_DELAY)
+                    self.wake.set()
+                    continue
+                if self.since_snapshot >= LEDGER_SNAPSHOT_EVERY:
+                    await self.snapshot()
+            except Exception as e:
+                print(f"Ledger writer error: {e}")
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        self.wake = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        try:
+            await self.snapshot()
+        except Exception as e:
+            print(f"Ledger snapshot at shutdown failed: {e}")
+        self.segment.close()
+
+coin_ledger = CoinLedger(LEDGER_DIR, [coin_transactions_db, user_rewards_db])
+
+def _ledger_state() -> Dict[str, Any]:
+    """Users and counters, copied so the snapshot can be encoded in a thread."""
+    return {
+        "users": [{k: list(v) if isinstance(v, list) else v for k, v in user.items()} for user in users_db],
+        "source_counts": [[u, src, n] for (u, src), n in coin_transactions_db.source_counts.items()],
+        "transaction_total": coin_transactions_db.total,
+        "user_reward_total": user_rewards_db.total,
+    }
+
+def _ledger_restore(state: Dict[str, Any]):
+    for user in state["users"]:
+        users_db.add(user)
+    # Older snapshots carried the history itself; queue it for the history files
+    transactions = state.get("transactions", [])
+    if isinstance(transactions, dict):
+        transactions = sorted((t for history in transactions.values() for t in history),
+                              key=lambda t: _record_number(t["id"]))
+    for transaction in transactions:
+        coin_transactions_db.append(transaction["user_id"], transaction, 0)
+    for record in state.get("user_rewards", []):
+        user_rewards_db.append(record["user_id"], record, 0)
+    coin_transactions_db.restore(state["source_counts"], state["transaction_total"])
+    user_rewards_db.total = state.get("user_reward_total", len(state.get("user_rewards", [])))
+
+def _ledger_apply(record: Dict[str, Any]):
+    if record["op"] == "txn":
+        # The record carries the user's state after the transaction
+        users_db.add(record["user"])
+        coin_transactions_db.add(record["txn"], record["seq"])
+    elif record["op"] == "user_reward":
+        user_rewards_db.append(record["record"]["user_id"], record["record"], record["seq"])
+
+@app.on_event("startup")
+async def start_storage():
+    await storage.start()
+
+@app.on_event("shutdown")
+async def stop_storage():
+    await storage.stop()
 
 def calculate_video_coins(duration_minutes: int, category: str) -> int:
     """Calculate coins earned for watching a video - 2 coins for full video"""
@@ -832,36 +4594,45 @@ def calculate_recreation_coins(duration_minutes: int) -> int:
     # Fixed 3 coins for creating recreation content
     return 3
 
+def calculate_earn_amount(source: str, duration_minutes: int, category: str) -> int:
+    """Coins for one activity event, by source"""
+    if source == "video":
+        return calculate_video_coins(duration_minutes, category)
+    if source == "song":
+        return calculate_song_coins(duration_minutes)
+    if source == "recreation":
+        return calculate_recreation_coins(duration_minutes)
+    if source == "game":
+        # For games, the frontend passes the awarded amount (validated server-side
+        # by the game launcher + result polling). Trust small integer here.
+        try:
+            amount = int(duration_minutes)
+        except Exception:
+            amount = 0
+        return min(max(amount, 0), 5)
+    if source == "daily":
+        return 10  # Daily login bonus
+    return 5  # Default amount
+
 # ==================== COIN SYSTEM API ENDPOINTS ====================
 
 @app.get("/api/user/{user_id}")
 async def get_user_profile(user_id: str):
     """Get user profile with coin balance and stats"""
-    user = get_user(user_id)
+    user = await run_storage(get_user, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-# SPA fallback for client-side routes (excluding API and static paths)
-@app.get("/{full_path:path}")
-async def spa_fallback(full_path: str):
-    # Allow API and static to pass through 404 normally
-    if full_path.startswith("api/") or full_path.startswith("static/") or full_path.startswith("Games/"):
-        return JSONResponse({"detail": "Not Found"}, status_code=404)
-    # Only serve SPA for known frontend routes; avoid masking API 404s
-    if os.path.exists(SPA_INDEX):
-        return FileResponse(SPA_INDEX)
-    return JSONResponse({"detail": "SPA not built"}, status_code=404)
-
-
-
-# SPA fallback for client-side routes (excluding API and static paths)
-
 @app.get("/api/user/{user_id}/transactions")
-async def get_user_transactions(user_id: str, limit: int = 50):
-    """Get user's coin transaction history"""
-    user_transactions = [tx for tx in coin_transactions_db if tx["user_id"] == user_id]
-    return sorted(user_transactions, key=lambda x: x["timestamp"], reverse=True)[:limit]
+async def get_user_transactions(user_id: str, limit: int = 50, before: Optional[str] = None):
+    """Get user's coin transaction history, newest first.
+    Pass the last id you received as `before` to page back through older entries."""
+    try:
+        # Reads the history files for either backend, so keep it off the loop
+        return await asyncio.to_thread(storage.user_transactions, user_id, max(0, limit), before)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.post("/api/user/{user_id}/earn-coins")
 async def earn_coins_endpoint(
@@ -872,81 +4643,94 @@ async def earn_coins_endpoint(
     category: str = Form("general")
 ):
     """Earn coins for various activities"""
-    user = get_user(user_id)
+    user = await run_storage(get_user, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Calculate coins based on source
-    if source == "video":
-        amount = calculate_video_coins(duration_minutes, category)
-    elif source == "song":
-        amount = calculate_song_coins(duration_minutes)
-    elif source == "recreation":
-        amount = calculate_recreation_coins(duration_minutes)
-    elif source == "game":
-        # For games, the frontend passes the awarded amount (validated server-side
-        # by the game launcher + result polling). Trust small integer here.
-        try:
-            amount = int(duration_minutes)
-        except Exception:
-            amount = 0
-        if amount < 0:
-            amount = 0
-        if amount > 5:
-            amount = 5
-    elif source == "daily":
-        amount = 10  # Daily login bonus
-    else:
-        amount = 5  # Default amount
+    amount = calculate_earn_amount(source, duration_minutes, category)
     
     # Add coins
-    success = add_coins(user_id, amount, source, source_id, f"Earned {amount} coins from {source}")
+    user = await run_storage(add_coins, user_id, amount, source, source_id, f"Earned {amount} coins from {source}")
     
-    if success:
+    if user:
+        await storage.sync()
         return {"message": f"Earned {amount} coins!", "coins_earned": amount, "new_balance": user["coins"]}
     else:
         raise HTTPException(status_code=500, detail="Failed to add coins")
 
+class EarnEvent(BaseModel):
+    source: str
+    source_id: Optional[str] = None
+    duration_minutes: int = 0
+    category: str = "general"
+
+EARN_BATCH_MAX_EVENTS = 100
+
+@app.post("/api/user/{user_id}/earn-coins/batch")
+async def earn_coins_batch(user_id: str, events: List[EarnEvent]):
+    """Earn coins for several activity events (JSON array) in one atomic change.
+    Level-ups are evaluated once for the whole batch; any bonus is added to the
+    last event's transaction, as a single earn adds it to its own."""
+    if not events:
+        raise HTTPException(status_code=400, detail="No events")
+    if len(events) > EARN_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {EARN_BATCH_MAX_EVENTS} events per batch")
+    amounts = [calculate_earn_amount(e.source, e.duration_minutes, e.category) for e in events]
+    total = sum(amounts)
+
+    def operation(user):
+        user["coins"] += total
+        user["experience"] += total
+        bonus = _level_up(user)
+        user["last_activity"] = datetime.now().isoformat()
+        transactions = [_transaction(user_id, amount, "earn", e.source, e.source_id, f"Earned {amount} coins from {e.source}")
+                        for e, amount in zip(events, amounts)]
+        transactions[-1]["amount"] += bonus
+        return transactions, []
+
+    result = await run_storage(apply_coin_operation, user_id, operation)
+    if not result:
+        raise HTTPException(status_code=404, detail="User not found")
+    await storage.sync()
+    transactions = result["transactions"]
+    bonus = transactions[-1]["amount"] - amounts[-1]
+    return {
+        "results": [{"index": i, "source": e.source, "coins_earned": amount, "transaction_id": txn["id"]}
+                    for i, (e, amount, txn) in enumerate(zip(events, amounts, transactions))],
+        "coins_earned": total + bonus,
+        "level_up_bonus": bonus,
+        "new_balance": result["user"]["coins"],
+        "level": result["user"]["level"],
+    }
+
 @app.get("/api/rewards")
-async def get_rewards(category: Optional[str] = None):
+async def get_rewards(request: Request, response: Response, category: Optional[str] = None):
     """Get available rewards"""
-    if category:
-        return [reward for reward in rewards_db if reward["category"] == category and reward["is_available"]]
-    return [reward for reward in rewards_db if reward["is_available"]]
+    etag, not_modified = _conditional(request, "rewards", await run_storage(storage.rewards_version))
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return await run_storage(storage.list_rewards, category)
 
 @app.post("/api/user/{user_id}/redeem-reward/{reward_id}")
 async def redeem_reward(user_id: str, reward_id: str):
     """Redeem a reward using coins"""
-    user = get_user(user_id)
+    user = await run_storage(get_user, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Find reward
-    reward = None
-    for r in rewards_db:
-        if r["id"] == reward_id and r["is_available"]:
-            reward = r
-            break
-
-    if not reward:
+    reward = await run_storage(storage.get_reward, reward_id)
+    if not reward or not reward["is_available"]:
         raise HTTPException(status_code=404, detail="Reward not found")
     
-    if user["coins"] < reward["cost"]:
+    # Spend coins and record the redemption in one atomic change
+    user = await run_storage(spend_coins, user_id, reward["cost"], "reward", reward_id, f"Redeemed {reward['name']}",
+                             reward_id=reward_id)
+    if not user:
         raise HTTPException(status_code=400, detail="Insufficient coins")
-    
-    # Spend coins
-    if not spend_coins(user_id, reward["cost"], "reward", reward_id, f"Redeemed {reward['name']}"):
-        raise HTTPException(status_code=500, detail="Failed to process redemption")
-    
-    # Create user reward record
-    user_reward = {
-        "id": f"user_reward_{len(user_rewards_db) + 1}",
-        "user_id": user_id,
-        "reward_id": reward_id,
-        "redeemed_at": datetime.now().isoformat(),
-        "is_used": False
-    }
-    user_rewards_db.append(user_reward)
+    await storage.sync()
     
     return {
         "message": f"Successfully redeemed {reward['name']}!",
@@ -957,12 +4741,12 @@ async def redeem_reward(user_id: str, reward_id: str):
 @app.get("/api/user/{user_id}/rewards")
 async def get_user_rewards(user_id: str):
     """Get user's redeemed rewards"""
-    user_rewards = [ur for ur in user_rewards_db if ur["user_id"] == user_id]
+    user_rewards = await asyncio.to_thread(storage.list_user_rewards, user_id)
     
     # Add reward details
     result = []
     for ur in user_rewards:
-        reward = next((r for r in rewards_db if r["id"] == ur["reward_id"]), None)
+        reward = await run_storage(storage.get_reward, ur["reward_id"])
         if reward:
             result.append({
                 **ur,
@@ -974,7 +4758,7 @@ async def get_user_rewards(user_id: str):
 @app.get("/api/user/{user_id}/achievements")
 async def get_user_achievements(user_id: str):
     """Get user's achievements and progress"""
-    user = get_user(user_id)
+    user = await run_storage(get_user, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -982,8 +4766,7 @@ async def get_user_achievements(user_id: str):
     achievements = []
     
     # Video watching achievements
-    video_transactions = [tx for tx in coin_transactions_db if tx["user_id"] == user_id and tx["source"] == "video"]
-    videos_watched = len(video_transactions)
+    videos_watched = await run_storage(storage.count_transactions, user_id, "video")
     
     if videos_watched >= 5:
         achievements.append({"id": "video_master", "name": "Video Master", "description": "Watched 5+ videos", "unlocked": True})
@@ -1241,6 +5024,16 @@ async def report_game_result(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Report failed: {e}")
 
+# SPA fallback for client-side routes (excluding API and static paths).
+# Registered last: a catch-all GET route shadows every GET route declared after it.
+@app.get("/{full_path:path}")
+async def spa_fallback(full_path: str, request: Request):
+    # Allow API and static to pass through 404 normally
+    if full_path.startswith("api/") or full_path.startswith("static/") or full_path.startswith("Games/"):
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    # Only serve SPA for known frontend routes; avoid masking API 404s
+    return _spa_index_response(request, JSONResponse({"detail": "SPA not built"}, status_code=404))
+
 if __name__ == "__main__":
     import uvicorn
     import os
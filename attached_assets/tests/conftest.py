@@ -0,0 +1,45 @@
+"""Each test imports the app fresh inside its own working directory, so the
+module-level stores start from the sample data and data/ starts empty.
+
+Run from attached_assets/: python -m pytest tests
+"""
+import importlib.util
+import itertools
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_1758209791845.py")
+_loads = itertools.count()
+
+
+def load_main():
+    """A fresh copy of the app module, reading state from the current directory."""
+    name = f"wellness_main_{next(_loads)}"
+    spec = importlib.util.spec_from_file_location(name, MAIN)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for path in ("static/videos", "static/songs", "templates"):
+        os.makedirs(path)
+    monkeypatch.setenv("LEDGER_COMMIT_WINDOW_MS", "1")
+    return tmp_path
+
+
+@pytest.fixture
+def main(workdir):
+    return load_main()
+
+
+@pytest.fixture
+def client(main):
+    with TestClient(main.app) as c:
+        yield c
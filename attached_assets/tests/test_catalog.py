@@ -0,0 +1,62 @@
+import pytest
+
+
+def _movie(title, category="trending"):
+    return {"title": title, "description": "", "genre": "Drama", "year": 2020, "rating": 5.0, "poster_url": "",
+            "backdrop_url": "", "cast": [], "director": "", "duration": "1h", "category": category}
+
+
+def test_movie_store_ids_are_never_reused(main):
+    store = main.MovieStore([dict(_movie("A"), id=1), dict(_movie("B", "new"), id=2)])
+    store.delete(2)
+    movie = dict(_movie("C", "new"), id=store.allocate_id())
+    store.insert(movie)
+    assert movie["id"] == 3
+    assert [m["title"] for m in store.list("new")] == ["C"]
+    assert store.get(2) is None
+
+
+def test_movie_pages_walk_the_whole_listing(client):
+    everything = [m["id"] for m in client.get("/api/movies").json()]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/movies", params=params).json()
+        seen += [m["id"] for m in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == everything
+
+
+@pytest.mark.parametrize("limit", [0, -1, 201])
+def test_page_limit_out_of_range_is_rejected(client, limit):
+    assert client.get("/api/movies", params={"limit": limit}).status_code == 422
+
+
+def test_cursor_from_another_listing_is_rejected(client, main):
+    cursor = main._encode_cursor("videos", 1)
+    assert client.get("/api/movies", params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/movies", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_etag_revalidates_until_the_catalog_changes(client):
+    first = client.get("/api/movies")
+    etag = first.headers["etag"]
+    assert client.get("/api/movies", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/movies", json=_movie("Fresh"))
+    changed = client.get("/api/movies", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_video_catalog_buckets_and_pages_by_category(client, main):
+    for i, category in enumerate(["Breathwork", "Yoga", "breathwork"]):
+        main.frontend_videos.append(main.FrontendVideo(id=f"vid_{i}", title=f"Clip {i}", category=category,
+                                                       duration="1:00", created_at="2024-01-01"))
+    breathwork = client.get("/api/videos/category/BREATHWORK").json()
+    assert [v["id"] for v in breathwork] == ["vid_0", "vid_2"]
+    page = client.get("/api/videos/category/breathwork", params={"limit": 1}).json()
+    assert [v["id"] for v in page["items"]] == ["vid_0"]
+    rest = client.get("/api/videos/category/breathwork", params={"limit": 1, "cursor": page["next_cursor"]}).json()
+    assert [v["id"] for v in rest["items"]] == ["vid_2"] and rest["next_cursor"] is None
+    assert client.get("/api/videos/category/Missing").json() == []
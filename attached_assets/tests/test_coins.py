@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+from conftest import load_main
+from fastapi.testclient import TestClient
+
+USER = "user_123"
+
+
+def _earn(client, n, source="video"):
+    for i in range(n):
+        response = client.post(f"/api/user/{USER}/earn-coins", data={"source": source, "source_id": f"{source}{i}"})
+        assert response.status_code == 200, response.text
+    return client.get(f"/api/user/{USER}").json()["coins"]
+
+
+def _history(client, user_id=USER, page=3):
+    ids, before = [], None
+    while True:
+        params = {"limit": page, **({"before": before} if before else {})}
+        batch = client.get(f"/api/user/{user_id}/transactions", params=params).json()
+        if not batch:
+            return ids
+        ids += [t["id"] for t in batch]
+        before = batch[-1]["id"]
+
+
+def test_user_store_indexes_email_and_username(main):
+    users = main.UserStore()
+    users.add({"id": "u1", "email": "Ann@Example.com", "username": "Ann"})
+    assert users.get_by_email("ann@example.COM")["id"] == "u1"
+    users.get("u1")["username"] = "annie"
+    users.reindex("u1")
+    assert users.get_by_username("ANNIE")["id"] == "u1" and users.get_by_username("ann") is None
+    users.remove("u1")
+    assert users.get_by_email("ann@example.com") is None
+
+
+def test_transactions_page_newest_first(client):
+    _earn(client, 7)
+    ids = _history(client)
+    assert ids == [f"txn_{n}" for n in range(7, 0, -1)]
+    assert client.get(f"/api/user/{USER}/transactions", params={"before": "txn_999"}).status_code == 400
+    assert client.get(f"/api/user/{USER}/transactions", params={"before": "bogus"}).status_code == 400
+
+
+def test_ledger_survives_restart_with_history_outside_the_snapshot(main):
+    with TestClient(main.app) as client:
+        balance = _earn(client, 5)
+    with open(os.path.join("data", "ledger", "snapshot.json")) as f:
+        snapshot = json.load(f)
+    assert "transactions" not in snapshot and snapshot["transaction_total"] == 5
+
+    restarted = load_main()
+    with TestClient(restarted.app) as client:
+        assert client.get(f"/api/user/{USER}").json()["coins"] == balance
+        assert _history(client) == [f"txn_{n}" for n in range(5, 0, -1)]
+        _earn(client, 1, "song")
+        assert _history(client)[0] == "txn_6"
+
+
+def test_ledger_replays_the_log_after_a_crash(main):
+    async def crashed_run():
+        await main.storage.start()
+        for _ in range(3):
+            main.add_coins(USER, 2, "video")
+        await main.storage.sync()
+        # No stop(): the process dies before its shutdown snapshot
+
+    asyncio.run(crashed_run())
+    balance = main.users_db.get(USER)["coins"]
+    assert not os.path.exists(os.path.join("data", "ledger", "snapshot.json"))
+
+    restarted = load_main()
+    with TestClient(restarted.app) as client:
+        assert client.get(f"/api/user/{USER}").json()["coins"] == balance
+        # History written before the crash is not duplicated by the replay
+        assert _history(client) == ["txn_3", "txn_2", "txn_1"]
+
+
+def test_torn_history_append_is_cut_off(main):
+    with TestClient(main.app) as client:
+        _earn(client, 2)
+    data_path, index_path = main.coin_transactions_db._paths(USER)
+    with open(data_path, "ab") as f:
+        f.write(b'{"id":"txn_3","us')
+    with open(index_path, "ab") as f:
+        f.write(b"\x00\x00\x00")
+
+    restarted = load_main()
+    with TestClient(restarted.app) as client:
+        _earn(client, 1)
+        assert _history(client) == ["txn_3", "txn_2", "txn_1"]
+    assert os.path.getsize(index_path) % restarted.UserHistory.INDEX_ENTRY.size == 0
+
+
+def test_snapshot_with_embedded_history_is_migrated(workdir):
+    os.makedirs(os.path.join("data", "ledger"))
+    legacy = {
+        "seq": 2,
+        "users": [{"id": USER, "username": "WellnessUser", "email": "user@wellness.com", "coins": 40, "level": 1,
+                   "experience": 0, "streak_days": 0, "last_activity": "", "achievements": [], "created_at": ""}],
+        "transactions": [{"id": "txn_1", "user_id": USER, "amount": 40, "transaction_type": "earn",
+                          "source": "daily", "source_id": None, "description": "", "timestamp": ""}],
+        "source_counts": [[USER, "daily", 1]],
+        "transaction_total": 1,
+        "user_rewards": [{"id": "user_reward_1", "user_id": USER, "reward_id": "reward_001",
+                          "redeemed_at": "", "is_used": False}],
+    }
+    with open(os.path.join("data", "ledger", "snapshot.json"), "w") as f:
+        json.dump(legacy, f)
+    main = load_main()
+    with TestClient(main.app) as client:
+        assert _history(client) == ["txn_1"]
+        assert [r["id"] for r in client.get(f"/api/user/{USER}/rewards").json()] == ["user_reward_1"]
+        assert client.post(f"/api/user/{USER}/redeem-reward/reward_001").status_code == 200
+        assert [r["id"] for r in client.get(f"/api/user/{USER}/rewards").json()] == ["user_reward_1", "user_reward_2"]
+
+
+def test_old_log_segments_are_pruned(workdir, monkeypatch):
+    monkeypatch.setenv("LEDGER_SNAPSHOT_EVERY", "2")
+    monkeypatch.setenv("LEDGER_ARCHIVE_KEEP", "2")
+    main = load_main()
+    for _ in range(3):
+        with TestClient(main.app) as client:
+            _earn(client, 3)
+        main = load_main()
+    assert len(os.listdir(os.path.join("data", "ledger", "archive"))) == 2
+
+
+def test_spend_cannot_overdraw_under_concurrency(main):
+    start = main.users_db.get(USER)["coins"]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(main.spend_coins(USER, start, "reward")))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(r is not None for r in results) == 1
+    assert main.users_db.get(USER)["coins"] == 0
+
+
+@pytest.fixture
+def sqlite_main(workdir, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    main = load_main()
+    assert isinstance(main.storage, main.SqliteRepository)
+    return main
+
+
+def test_sqlite_commit_is_compare_and_set(sqlite_main):
+    storage = sqlite_main.storage
+    user, version = storage.get_user_for_update(USER)
+    user["coins"] += 1
+    assert storage.commit_coin_change(dict(user), version, [], []) is not None
+    assert storage.commit_coin_change(dict(user), version, [], []) is None
+
+
+def test_sqlite_concurrent_earns_all_land(sqlite_main):
+    start = sqlite_main.storage.get_user(USER)["coins"]
+    threads = [threading.Thread(target=sqlite_main.add_coins, args=(USER, 1, "video")) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    user = sqlite_main.storage.get_user(USER)
+    assert user["coins"] - start >= 20  # level-up bonuses come on top
+    assert len(sqlite_main.storage.user_transactions(USER, 50)) == 20
+
+    restarted = load_main()
+    assert restarted.storage.get_user(USER)["coins"] == user["coins"]
+
+
+def test_batch_earn_is_one_atomic_change(client):
+    events = [{"source": "video"}, {"source": "song"}, {"source": "daily"}]
+    body = client.post(f"/api/user/{USER}/earn-coins/batch", json=events).json()
+    assert [r["transaction_id"] for r in body["results"]] == ["txn_1", "txn_2", "txn_3"]
+    assert body["coins_earned"] == 2 + 3 + 10 + body["level_up_bonus"]
+    assert client.get(f"/api/user/{USER}").json()["coins"] == body["new_balance"]
+
+    assert client.post(f"/api/user/{USER}/earn-coins/batch", json=[]).status_code == 400
+    assert client.post(f"/api/user/{USER}/earn-coins/batch", json=[{"source": "video"}] * 101).status_code == 400
+    assert client.post("/api/user/nobody/earn-coins/batch", json=events).status_code == 404
@@ -0,0 +1,109 @@
+import os
+import wave
+
+
+def _write_song(name, data):
+    with open(os.path.join("static", "songs", name), "wb") as f:
+        f.write(data)
+
+
+def test_parse_ranges(main):
+    assert main._parse_ranges("bytes=0-9", 100) == [(0, 9)]
+    assert main._parse_ranges("bytes=90-", 100) == [(90, 99)]
+    assert main._parse_ranges("bytes=-10", 100) == [(90, 99)]
+    assert main._parse_ranges("bytes=0-1,5-6", 100) == [(0, 1), (5, 6)]
+    assert main._parse_ranges("bytes=200-300", 100) == []
+    assert main._parse_ranges("items=0-1", 100) is None
+    assert main._parse_ranges("bytes=5-1", 100) is None
+
+
+def test_single_and_multi_range_responses(workdir, client):
+    data = bytes(range(256)) * 4
+    _write_song("tone.mp3", data)
+    full = client.get("/media/songs/tone.mp3")
+    assert full.status_code == 200 and full.content == data
+    assert full.headers["accept-ranges"] == "bytes"
+
+    part = client.get("/media/songs/tone.mp3", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    assert part.content == data[10:20]
+
+    multi = client.get("/media/songs/tone.mp3", headers={"Range": "bytes=0-3,100-103"})
+    assert multi.status_code == 206
+    assert multi.headers["content-type"].startswith("multipart/byteranges; boundary=")
+    assert f"Content-Range: bytes 0-3/{len(data)}".encode() in multi.content
+    assert f"Content-Range: bytes 100-103/{len(data)}".encode() in multi.content
+    assert data[100:104] in multi.content
+
+
+def test_unsatisfiable_range_and_stale_if_range(workdir, client):
+    _write_song("tone.mp3", b"x" * 50)
+    missed = client.get("/media/songs/tone.mp3", headers={"Range": "bytes=500-"})
+    assert missed.status_code == 416 and missed.headers["content-range"] == "bytes */50"
+    stale = client.get("/media/songs/tone.mp3", headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+    assert stale.status_code == 200 and len(stale.content) == 50
+
+
+def test_media_paths_stay_inside_their_directory(workdir, client):
+    open("secret.mp3", "wb").close()
+    assert client.get("/media/songs/..%2Fsecret.mp3").status_code == 404
+    assert client.get("/media/other/tone.mp3").status_code == 404
+
+
+def test_probe_reads_wav_duration(workdir, main):
+    path = os.path.join("static", "songs", "beep.wav")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b"\x00\x00" * 16000)
+    assert abs(main.probe_media(path) - 2.0) < 0.01
+    assert main._format_duration(main.probe_media(path)) == "0:02"
+    assert main.probe_media(__file__) is None
+
+
+def test_indexer_picks_up_new_files_incrementally(workdir, main):
+    before = len(main.frontend_videos)
+    _write_song("new_track.mp3", b"ID3" + b"\x00" * 64)
+    main._apply_media_scan(main._scan_media_dirs())
+    assert len(main.frontend_videos) == before + 1
+    os.remove(os.path.join("static", "songs", "new_track.mp3"))
+    main._apply_media_scan(main._scan_media_dirs())
+    assert len(main.frontend_videos) == before
+
+
+def test_image_variant_cache_renders_once_and_evicts_lru(workdir, main):
+    import asyncio
+
+    cache = main.ImageVariantCache(os.path.join("data", "img"), max_bytes=25, hot_items=4)
+    cache.load()
+    calls = []
+
+    def render(payload):
+        def write(dest):
+            calls.append(dest)
+            with open(dest, "wb") as f:
+                f.write(payload)
+            return payload
+        return write
+
+    async def scenario():
+        same = await asyncio.gather(*(cache.get("a.png", render(b"a" * 10)) for _ in range(3)))
+        assert same == [b"a" * 10] * 3 and len(calls) == 1
+        await cache.get("b.png", render(b"b" * 10))
+        await cache.get("a.png", render(b"unused"))  # hit: a becomes most recent
+        await cache.get("c.png", render(b"c" * 10))
+
+    asyncio.run(scenario())
+    assert list(cache.files) == ["a.png", "c.png"] and cache.evictions == 1
+    assert not os.path.exists(os.path.join("data", "img", "b.png"))
+
+
+def test_image_endpoint_validates_size_and_path(workdir, client):
+    os.makedirs(os.path.join("static", "images"))
+    with open(os.path.join("static", "images", "p.png"), "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+    assert client.get("/img/abc/p.png").status_code == 404
+    assert client.get("/img/5000x10/p.png").status_code == 400
+    assert client.get("/img/10x10/..%2F..%2Fsecret.png").status_code == 404
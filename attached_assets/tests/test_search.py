@@ -0,0 +1,43 @@
+def test_search_finds_title_words_and_prefixes(client):
+    titles = [r["title"] for r in client.get("/api/search", params={"query": "crown"}).json()["results"]]
+    assert "The Crown" in titles
+    # The last token is matched as a prefix while the user is still typing
+    titles = [r["title"] for r in client.get("/api/search", params={"query": "witc"}).json()["results"]]
+    assert "The Witcher" in titles
+
+
+def test_search_fuzzy_matches_typos_only_when_asked(client):
+    assert client.get("/api/search", params={"query": "strangr"}).json()["results"] == []
+    results = client.get("/api/search", params={"query": "strangr", "fuzzy": True}).json()["results"]
+    assert [r["title"] for r in results][:1] == ["Stranger Things"]
+
+
+def test_suggest_completes_any_word_of_a_title(client):
+    suggestions = client.get("/api/search/suggest", params={"prefix": "thi"}).json()["suggestions"]
+    assert "Stranger Things" in [s["title"] for s in suggestions]
+    assert client.get("/api/search/suggest", params={"prefix": ""}).json() == {"suggestions": []}
+
+
+def test_search_cache_is_invalidated_by_catalog_writes(client, main):
+    client.get("/api/search", params={"query": "dark"})
+    client.get("/api/search", params={"query": "dark"})
+    assert client.get("/api/search/cache-stats").json()["hits"] == 1
+    movie = {"title": "Dark Waters", "description": "x", "genre": "Drama", "year": 2019, "rating": 7.0,
+             "poster_url": "", "backdrop_url": "", "cast": [], "director": "", "duration": "2h"}
+    client.post("/api/movies", json=movie)
+    titles = [r["title"] for r in client.get("/api/search", params={"query": "dark"}).json()["results"]]
+    assert "Dark Waters" in titles
+
+
+def test_facet_counts_cover_every_match(client):
+    body = client.get("/api/search", params={"query": "the", "facets": True}).json()
+    assert sum(body["facets"]["type"].values()) >= len(body["results"]) > 0
+
+
+def test_facet_counts_are_per_value_id_sets(main):
+    index = main.SearchIndex()
+    for i in range(3):
+        index.add(("movie", i), {"title": f"Film {i}", "type": "movie", "category": "drama" if i else "comedy",
+                                 "year": 2000 + i})
+    counts = index.facet_counts(index.match("film", False))
+    assert counts["category"] == {"drama": 2, "comedy": 1}
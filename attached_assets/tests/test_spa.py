@@ -0,0 +1,63 @@
+import gzip
+import os
+
+import pytest
+from conftest import load_main
+from fastapi.testclient import TestClient
+
+DIST = os.path.join("ReactRecreation", "ReactRecreation", "dist", "public")
+BUNDLE = "console.log('wellness');\n" * 100
+
+
+@pytest.fixture
+def spa(workdir):
+    os.makedirs(os.path.join(DIST, "assets"))
+    with open(os.path.join(DIST, "index.html"), "w") as f:
+        f.write("<html>v1</html>")
+    with open(os.path.join(DIST, "assets", "index-Bx7kQ2aZ.js"), "w") as f:
+        f.write(BUNDLE)
+    with open(os.path.join(DIST, "assets", "logo-settings.png"), "wb") as f:
+        f.write(b"\x89PNG")
+    main = load_main()
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+def test_hashed_bundle_is_precompressed_and_immutable(spa):
+    main, client = spa
+    response = client.get("/assets/index-Bx7kQ2aZ.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.text == BUNDLE
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == main.SPA_IMMUTABLE_CACHE
+    with open(os.path.join(DIST, "assets", "index-Bx7kQ2aZ.js.gz"), "rb") as f:
+        assert gzip.decompress(f.read()).decode() == BUNDLE
+
+    plain = client.get("/assets/logo-settings.png", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["cache-control"] == "no-cache" and "content-encoding" not in plain.headers
+    assert client.get("/assets/logo-settings.png", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+
+
+def test_index_html_is_served_from_memory_with_etag(spa):
+    _, client = spa
+    first = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert first.text == "<html>v1</html>" and first.headers["cache-control"] == "no-cache"
+    assert client.get("/", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+
+def test_bundles_from_a_rebuild_are_served_without_restart(spa):
+    main, client = spa
+    with open(os.path.join(DIST, "assets", "index-Ny8pL3cD.js"), "w") as f:
+        f.write("new build")
+    assert client.get("/assets/index-Ny8pL3cD.js").text == "new build"
+    assert "index-Ny8pL3cD.js" in main.spa_assets
+
+    os.remove(os.path.join(DIST, "assets", "index-Bx7kQ2aZ.js"))
+    assert client.get("/assets/index-Bx7kQ2aZ.js", headers={"Accept-Encoding": "identity"}).status_code == 404
+
+
+def test_asset_lookups_stay_inside_the_assets_dir(spa):
+    _, client = spa
+    with open("secret.js", "w") as f:
+        f.write("secret")
+    assert client.get("/assets/..%2F..%2F..%2F..%2F..%2Fsecret.js").status_code == 404
+    assert client.get("/assets/missing-Zz9Yy8Xx.js").status_code == 404
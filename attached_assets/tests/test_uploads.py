@@ -0,0 +1,116 @@
+import os
+import time
+
+from conftest import load_main
+from fastapi.testclient import TestClient
+
+WEBM = b"\x1aE\xdf\xa3" + b"\x00" * 60
+
+
+def _upload(client, name, data=WEBM):
+    response = client.post("/api/recreation/videos", files={"file": (name, data, "video/webm")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _wait_for_job(client, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_upload_is_listed_newest_first_and_processed_in_background(client):
+    first = _upload(client, "first.webm")
+    second = _upload(client, "second.webm")
+    listing = [item["id"] for item in client.get("/api/recreation/videos").json()]
+    assert listing == [second["id"], first["id"]]
+
+    job = _wait_for_job(client, second["job_id"])
+    assert job["status"] == "succeeded"
+    assert os.path.getsize(os.path.join("static", "recreation", "thumbnails", job["result"]["thumbnail"])) > 0
+
+
+def test_unreadable_upload_fails_its_job_without_retries(client):
+    item = _upload(client, "junk.webm", b"not a video")
+    job = _wait_for_job(client, item["job_id"])
+    assert job["status"] == "failed" and job["attempts"] == 1
+
+
+def test_identical_uploads_share_one_blob(client, main):
+    a = _upload(client, "copy_a.webm")
+    b = _upload(client, "copy_b.webm")
+    assert list(main.blob_refcounts.values()) == [2]
+    digest = main.blob_refs[a["id"]]["sha256"]
+    shard = os.path.dirname(main._blob_path(digest))
+
+    assert client.delete(f"/api/recreation/videos/{a['id']}").status_code == 200
+    assert os.path.exists(main._blob_path(digest))
+    assert client.delete(f"/api/recreation/videos/{b['id']}").status_code == 200
+    assert not os.path.exists(main._blob_path(digest)) and not os.path.exists(shard)
+
+
+def test_blob_refs_survive_a_restart(main):
+    with TestClient(main.app) as client:
+        item = _upload(client, "kept.webm")
+    restarted = load_main()
+    with TestClient(restarted.app):
+        assert restarted.blob_refs[item["id"]]["sha256"] == main.blob_refs[item["id"]]["sha256"]
+        assert list(restarted.blob_refcounts.values()) == [1]
+
+
+def test_recreation_listing_pages_with_cursor(client):
+    ids = {_upload(client, f"page_{i}.webm")["id"] for i in range(3)}
+    page = client.get("/api/recreation/videos", params={"limit": 2}).json()
+    rest = client.get("/api/recreation/videos", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+    assert {item["id"] for item in page["items"] + rest["items"]} == ids
+    assert rest["next_cursor"] is None
+
+
+def test_resumable_upload_offsets(client):
+    created = client.post("/api/recreation/uploads", json={"filename": "long.webm", "size": len(WEBM)})
+    assert created.status_code == 201
+    sid = created.json()["id"]
+
+    first = client.patch(f"/api/recreation/uploads/{sid}", content=WEBM[:20], headers={"Upload-Offset": "0"})
+    assert first.status_code == 200 and first.headers["upload-offset"] == "20"
+    # A client that lost track of the offset is told where to resume
+    stale = client.patch(f"/api/recreation/uploads/{sid}", content=WEBM[:20], headers={"Upload-Offset": "0"})
+    assert stale.status_code == 409 and stale.json()["offset"] == 20
+    assert client.get(f"/api/recreation/uploads/{sid}").headers["upload-offset"] == "20"
+
+    early = client.post(f"/api/recreation/uploads/{sid}/finalize")
+    assert early.status_code == 409
+    too_much = client.patch(f"/api/recreation/uploads/{sid}", content=WEBM[20:] + b"x", headers={"Upload-Offset": "20"})
+    assert too_much.status_code == 413
+
+    offset = client.get(f"/api/recreation/uploads/{sid}").json()["offset"]
+    rest = client.patch(f"/api/recreation/uploads/{sid}", content=WEBM[offset:], headers={"Upload-Offset": str(offset)})
+    assert rest.json()["offset"] == len(WEBM)
+    done = client.post(f"/api/recreation/uploads/{sid}/finalize")
+    assert done.status_code == 200 and done.json()["size_bytes"] == len(WEBM)
+    assert client.get(f"/api/recreation/uploads/{sid}").status_code == 404
+
+
+def test_aborted_upload_is_gone(client, main):
+    sid = client.post("/api/recreation/uploads", json={"filename": "a.webm"}).json()["id"]
+    assert client.delete(f"/api/recreation/uploads/{sid}").status_code == 200
+    assert client.patch(f"/api/recreation/uploads/{sid}", content=b"x", headers={"Upload-Offset": "0"}).status_code == 404
+    assert os.listdir(main.UPLOAD_SESSIONS_DIR) == []
+
+
+def test_declared_size_over_the_limit_is_refused(client, main):
+    response = client.post("/api/recreation/uploads",
+                           json={"filename": "big.webm", "size": main.RECREATION_MAX_UPLOAD_BYTES + 1})
+    assert response.status_code == 413
+
+
+def test_finished_jobs_are_pruned(client, main):
+    main.JOB_HISTORY_MAX = 1
+    jobs = [_wait_for_job(client, _upload(client, f"prune_{i}.webm")["job_id"]) for i in range(2)]
+    assert client.get(f"/api/jobs/{jobs[0]['id']}").status_code == 404
+    assert client.get(f"/api/jobs/{jobs[1]['id']}").status_code == 200
+    assert os.listdir(main.JOBS_DIR) == [f"{jobs[1]['id']}.json"]